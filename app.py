@@ -3,11 +3,15 @@ from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
+import queue
+import time
 from typing import Optional
 
+from enhancement import api, clahe, histogram_render, histograms, image_io, metrics, transforms
+from enhancement.background import LatestOnlyWorker
+from enhancement.pyramid import DisplayPyramid
+
 # --- Constants ---
 BG_COLOR = "#2e2e2e"
 FRAME_COLOR = "#3c3c3c"
@@ -17,8 +21,11 @@ ACCENT_HOVER = "#009cff"
 ERROR_COLOR = "#e74c3c"
 CANVAS_BG = "#1c1c1c"
 
-HISTOGRAM_PIXEL_LIMIT = 250000
 OUTPUT_DIR = "output"
+WORKER_POLL_MS = 15
+METRICS_ENV = "ENHANCE_METRICS"  # When set, the per-stage frame timings are printed on exit
+CLIP_LIMIT_MIN, CLIP_LIMIT_MAX = 0.5, 10.0
+TILE_GRID_MIN, TILE_GRID_MAX = 2, 16
 
 class ImageEnhancerApp:
     def __init__(self, root: tk.Tk):
@@ -29,18 +36,30 @@ class ImageEnhancerApp:
 
         # --- Instance Variables ---
         self.original_image: Optional[np.ndarray] = None
-        self.processed_image: Optional[np.ndarray] = None
+        self.pyramid: Optional[DisplayPyramid] = None
         self.tk_original_image: Optional[ImageTk.PhotoImage] = None
         self.tk_processed_image: Optional[ImageTk.PhotoImage] = None
         self.original_filename: Optional[str] = None
+        self.histogram_service: Optional[histograms.HistogramService] = None
+        self.clahe_model: Optional[clahe.ClaheModel] = None
+        self.processed_lut: Optional[np.ndarray] = None
         
-        self.debounce_timer: Optional[str] = None
-        self.lut_cache: dict = {}
         self.last_canvas_sizes: dict = {}
+        self.canvas_items: dict = {}
+        self.hist_views: dict = {}
+        self.frame_metrics = metrics.Recorder()   # Per-stage time of every painted frame
+        self.frame_latency = metrics.Recorder()   # End-to-end slider-to-paint time of the same frames
+
+        # --- Enhancement runs off the Tk thread; only the latest request is processed ---
+        self.worker = LatestOnlyWorker()
         
         self.setup_styles()
         self.setup_gui()
+        self.root.after(WORKER_POLL_MS, self.poll_worker)
         
+        # --- Precompute the gamma LUTs for the whole slider range ---
+        transforms.gamma_lut_family(transforms.GAMMA_MIN, transforms.GAMMA_MAX)
+
         # --- Create output directory on startup ---
         if not os.path.exists(OUTPUT_DIR):
             os.makedirs(OUTPUT_DIR)
@@ -60,6 +79,10 @@ class ImageEnhancerApp:
         style.configure('Horizontal.TScale', background=FRAME_COLOR, troughcolor=BG_COLOR)
 
     def setup_gui(self):
+        self.status_var = tk.StringVar(value="Load an image to begin.")
+        status_bar = ttk.Label(self.root, textvariable=self.status_var, font=('Segoe UI', 9), anchor=tk.W)
+        status_bar.pack(side=tk.BOTTOM, fill=tk.X, padx=15, pady=(0, 8))
+
         main_pane = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
         main_pane.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
         
@@ -86,7 +109,8 @@ class ImageEnhancerApp:
         tech_frame.pack(fill=tk.X, pady=15)
         self.technique_var = tk.StringVar(value="None")
         
-        techniques = [("None (Show Original)", "None"), ("Histogram Equalization", "hist_eq"), ("Power-Law (Gamma)", "gamma")]
+        techniques = [("None (Show Original)", "None"), ("Histogram Equalization", "hist_eq"), ("Power-Law (Gamma)", "gamma"),
+                      ("CLAHE (Adaptive Equalization)", "clahe"), ("Window / Level", "window")]
         for text, value in techniques:
             ttk.Radiobutton(tech_frame, text=text, variable=self.technique_var, value=value, command=self.on_technique_change).pack(anchor=tk.W, pady=3)
         
@@ -95,7 +119,33 @@ class ImageEnhancerApp:
         
         self.gamma_label = ttk.Label(self.params_frame, text="Gamma (γ): 1.00")
         self.gamma_var = tk.DoubleVar(value=1.0)
-        self.gamma_slider = ttk.Scale(self.params_frame, from_=0.1, to=5.0, variable=self.gamma_var, orient=tk.HORIZONTAL, command=self.on_slider_change)
+        self.gamma_slider = ttk.Scale(self.params_frame, from_=transforms.GAMMA_MIN, to=transforms.GAMMA_MAX, variable=self.gamma_var, orient=tk.HORIZONTAL, command=self.on_slider_change)
+
+        self.clip_label = ttk.Label(self.params_frame)
+        self.clip_var = tk.DoubleVar(value=clahe.DEFAULT_CLIP_LIMIT)
+        self.clip_slider = ttk.Scale(self.params_frame, from_=CLIP_LIMIT_MIN, to=CLIP_LIMIT_MAX, variable=self.clip_var, orient=tk.HORIZONTAL, command=self.on_slider_change)
+        self.tiles_label = ttk.Label(self.params_frame)
+        self.tiles_var = tk.DoubleVar(value=clahe.DEFAULT_TILES[0])
+        self.tiles_slider = ttk.Scale(self.params_frame, from_=TILE_GRID_MIN, to=TILE_GRID_MAX, variable=self.tiles_var, orient=tk.HORIZONTAL, command=self.on_slider_change)
+
+        # Window ranges are set from each image's bit depth (and DICOM header) when it is loaded
+        self.center_label = ttk.Label(self.params_frame)
+        self.center_var = tk.DoubleVar(value=128)
+        self.center_slider = ttk.Scale(self.params_frame, from_=0, to=255, variable=self.center_var, orient=tk.HORIZONTAL, command=self.on_slider_change)
+        self.width_label = ttk.Label(self.params_frame)
+        self.width_var = tk.DoubleVar(value=256)
+        self.width_slider = ttk.Scale(self.params_frame, from_=1, to=256, variable=self.width_var, orient=tk.HORIZONTAL, command=self.on_slider_change)
+        self.voi_var = tk.StringVar(value="linear")
+        self.voi_frame = ttk.Frame(self.params_frame, style='TFrame')
+        for voi in transforms.VOI_FUNCTIONS:
+            ttk.Radiobutton(self.voi_frame, text=voi.capitalize(), variable=self.voi_var, value=voi, command=self.apply_enhancement).pack(side=tk.LEFT, padx=(0, 10))
+
+        # (label, control) pairs shown for each technique
+        self.param_widgets = {
+            "gamma": [(self.gamma_label, self.gamma_slider)],
+            "clahe": [(self.clip_label, self.clip_slider), (self.tiles_label, self.tiles_slider)],
+            "window": [(self.center_label, self.center_slider), (self.width_label, self.width_slider), (None, self.voi_frame)],
+        }
         
         self.reset_button = ttk.Button(parent_frame, text="Reset to Original", command=self.reset_image, state=tk.DISABLED, style='TButton')
         self.reset_button.pack(fill=tk.X, side=tk.BOTTOM, pady=10, ipady=5)
@@ -129,7 +179,14 @@ class ImageEnhancerApp:
         return frame, canvas, info_label
 
     def _create_histogram_frame(self, parent, title):
-        return ttk.Labelframe(parent, text=title, style='TLabelframe', padding=10)
+        frame = ttk.Labelframe(parent, text=title, style='TLabelframe', padding=10)
+        # A tiny requested size lets the grid, not the rendered image, decide the canvas size
+        canvas = tk.Canvas(frame, bg=FRAME_COLOR, width=1, height=1, relief=tk.FLAT, bd=0, highlightthickness=0)
+        canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        item = canvas.create_image(0, 0, anchor=tk.NW)
+        canvas.bind('<Configure>', lambda _e, f=frame: self.redraw_histogram(f))
+        self.hist_views[frame] = {"canvas": canvas, "item": item, "photo": None, "counts": None, "color": None}
+        return frame
 
     def on_canvas_resize(self, event: tk.Event):
         canvas = event.widget
@@ -138,104 +195,241 @@ class ImageEnhancerApp:
         self.last_canvas_sizes[id(canvas)] = (canvas_w, canvas_h)
         
         if canvas == self.original_canvas and self.original_image is not None:
-            self.display_image(self.original_image, self.original_canvas, 'original', self.original_info_label)
-        elif canvas == self.processed_canvas and self.processed_image is not None:
-            self.display_image(self.processed_image, self.processed_canvas, 'processed', self.processed_info_label)
+            self.display_image(self.original_canvas, 'original', self.original_info_label)
+        elif canvas == self.processed_canvas and self.original_image is not None:
+            if self.technique_var.get() == "clahe":
+                # CLAHE has no LUT to reuse; it is redone for the new size on the worker
+                self.apply_enhancement()
+            else:
+                self.display_image(self.processed_canvas, 'processed', self.processed_info_label, self.processed_lut)
 
     def on_slider_change(self, _=None):
-        if self.technique_var.get() == "gamma":
+        self.update_param_labels()
+        # No debounce needed: the worker drops every request except the latest
+        self.apply_enhancement()
+
+    def update_param_labels(self):
+        technique = self.technique_var.get()
+        if technique == "gamma":
             self.gamma_label.config(text=f"Gamma (γ): {self.gamma_var.get():.2f}")
-        if self.debounce_timer:
-            self.root.after_cancel(self.debounce_timer)
-        self.debounce_timer = self.root.after(100, self.apply_enhancement)
+        elif technique == "clahe":
+            params = self.current_param("clahe")
+            self.clip_label.config(text=f"Clip limit: {params.clip_limit:.1f}")
+            self.tiles_label.config(text="Tile grid: {} x {}".format(*params.tiles))
+        elif technique == "window":
+            window = self.current_param("window")
+            self.center_label.config(text=f"Window center: {window.center:g}")
+            self.width_label.config(text=f"Window width: {window.width:g}")
 
     def on_technique_change(self):
-        self.gamma_label.pack_forget(); self.gamma_slider.pack_forget()
-        if self.technique_var.get() == "gamma":
-            self.gamma_label.pack(anchor=tk.W)
-            self.gamma_slider.pack(fill=tk.X, pady=(0, 10))
+        for widgets in self.param_widgets.values():
+            for label, control in widgets:
+                if label is not None: label.pack_forget()
+                control.pack_forget()
+        for label, control in self.param_widgets.get(self.technique_var.get(), []):
+            if label is not None: label.pack(anchor=tk.W)
+            control.pack(fill=tk.X, pady=(0, 10))
+        self.update_param_labels()
         self.apply_enhancement()
 
+    def current_param(self, technique: str):
+        """Returns the slider settings for a technique: gamma, ClaheParams, WindowParams or None."""
+        if technique == "gamma":
+            return self.gamma_var.get()
+        if technique == "clahe":
+            tiles = int(round(self.tiles_var.get()))
+            return clahe.ClaheParams(round(self.clip_var.get(), 1), (tiles, tiles))
+        if technique == "window":
+            return transforms.WindowParams(round(self.center_var.get()), max(1, round(self.width_var.get())), self.voi_var.get())
+        return None
+
     def apply_enhancement(self):
         if self.original_image is None: return
         technique = self.technique_var.get()
-        
-        if technique == "hist_eq":
-            self.processed_image = cv2.equalizeHist(self.original_image)
-        elif technique == "gamma":
-            gamma = round(self.gamma_var.get(), 2)
-            cache_key = f"gamma_{gamma}"
-            if cache_key not in self.lut_cache:
-                inv_gamma = 1.0 / gamma
-                table = np.array([((i / 255.0) ** inv_gamma) * 255 for i in np.arange(256)]).astype("uint8")
-                self.lut_cache[cache_key] = table
-            self.processed_image = cv2.LUT(self.original_image, self.lut_cache[cache_key])
-        else:
-            self.processed_image = self.original_image.copy()
-        
-        self.display_image(self.processed_image, self.processed_canvas, 'processed', self.processed_info_label)
-        self.update_histograms()
+        started = time.perf_counter()
+        param = self.current_param(technique)
+        display_size = self._fit_size(self.processed_canvas, self.original_image)
+        hist_canvas = self.hist_views[self.hist_processed_frame]["canvas"]
+        hist_size = (hist_canvas.winfo_width(), hist_canvas.winfo_height())
+        if technique == "clahe":
+            self.worker.submit(self._clahe_job, self.clahe_model, self.pyramid, param, display_size,
+                               self.histogram_service.max_value, hist_size, self._histogram_max_value(), started)
+            return
+
+        # The rest are LUTs; the equalization LUT is derived from the cached source histogram
+        lut = self.histogram_service.lut_for(technique, param)
+        counts = self.histogram_service.processed_counts(lut)
+        lut_seconds = time.perf_counter() - started
+        self.worker.submit(self._enhancement_job, self.pyramid, lut, display_size,
+                           self.histogram_service.max_value, counts, hist_size, self._histogram_max_value(), started, lut_seconds)
+
+    @staticmethod
+    def _enhancement_job(pyramid, lut, display_size, max_value, counts, hist_size, hist_max_value, started, lut_seconds):
+        """Runs on the worker thread: no Tk calls here. All work is proportional to the screen size."""
+        with metrics.recording() as recorder:
+            recorder.add("lut", lut_seconds)
+            display = None
+            if display_size is not None:
+                with metrics.stage("display"):
+                    display = pyramid.display(display_size, lut, max_value)
+            hist = None
+            if hist_size[0] >= 2 and hist_size[1] >= 2:
+                with metrics.stage("histogram_render"):
+                    hist = histogram_render.render_histogram(counts, hist_size[0], hist_size[1], color=ERROR_COLOR, max_value=hist_max_value)
+        yield {"display": display, "lut": lut, "counts": counts, "hist": hist, "started": started, "metrics": recorder}
+
+    @staticmethod
+    def _clahe_job(model, pyramid, params, display_size, max_value, hist_size, hist_max_value, started):
+        """Runs on the worker thread. Yields a screen-sized preview, then the exact full-resolution histogram.
+
+        The preview applies the full-resolution tile tables to the display buffer, so moving a slider
+        costs one table rebuild (the tile histograms are cached) plus a screen-sized interpolation.
+        """
+        render = hist_size[0] >= 2 and hist_size[1] >= 2
+        with metrics.recording() as recorder:
+            with metrics.stage("clahe_tables"):
+                model.luts(*params)
+            display = counts = hist = None
+            if display_size is not None:
+                with metrics.stage("display"):
+                    preview = model.apply_resized(pyramid.resized(display_size), *params)
+                    display = image_io.to_8bit(preview, max_value)
+                with metrics.stage("histogram"):
+                    counts = histograms.compute_histogram(preview)
+                if render:
+                    with metrics.stage("histogram_render"):
+                        hist = histogram_render.render_histogram(counts, hist_size[0], hist_size[1], color=ERROR_COLOR, max_value=hist_max_value)
+        yield {"display": display, "lut": None, "counts": counts, "hist": hist, "started": started, "metrics": recorder}
+
+        with metrics.recording() as recorder:
+            with metrics.stage("clahe_full"):
+                counts = histograms.compute_histogram(model.apply(*params))
+            hist = None
+            if render:
+                with metrics.stage("histogram_render"):
+                    hist = histogram_render.render_histogram(counts, hist_size[0], hist_size[1], color=ERROR_COLOR, max_value=hist_max_value)
+        yield {"display": None, "lut": None, "counts": counts, "hist": hist, "started": started, "metrics": recorder, "refine": True}
+
+    def poll_worker(self):
+        try:
+            while True:
+                generation, result, error = self.worker.results.get_nowait()
+                if self.worker.is_stale(generation): continue
+                if error is not None:
+                    self.status_var.set(f"Enhancement failed: {error}")
+                else:
+                    self.apply_worker_result(result)
+        except queue.Empty:
+            pass
+        self.root.after(WORKER_POLL_MS, self.poll_worker)
 
-    def display_image(self, image_data, canvas, image_type, info_label):
-        canvas.delete("all")
+    def apply_worker_result(self, result):
+        recorder = result["metrics"]
+        paint_start = time.perf_counter()
+        self.processed_lut = result["lut"]
+        if result["display"] is not None:
+            self._paint_image(result["display"], self.processed_canvas, 'processed', self.processed_info_label)
+        self.plot_histogram(self.hist_processed_frame, result["counts"], ERROR_COLOR, "Enhanced Histogram", result["hist"])
+        now = time.perf_counter()
+        recorder.add("paint", now - paint_start)
+        if result.get("refine"):
+            # A later stage for a frame already on screen; its latency was reported with the preview
+            self.frame_metrics.merge(recorder)
+            return
+        # Whatever is left is time spent queued behind newer requests or waiting for the next poll
+        latency = now - result["started"]
+        recorder.add("queue_wait", max(0.0, latency - recorder.total_seconds()))
+        self.frame_metrics.merge(recorder)
+        self.frame_latency.add("slider_to_paint", latency)
+
+        breakdown = ", ".join(f"{name} {seconds * 1000:.0f}" for name, (seconds, _, _) in recorder.stages.items())
+        self.status_var.set(f"Slider-to-paint latency: {latency * 1000:.0f} ms ({breakdown})")
+
+    def _fit_size(self, canvas, image_data) -> Optional[tuple]:
         canvas_w, canvas_h = canvas.winfo_width(), canvas.winfo_height()
-        if image_data is None or canvas_w < 2 or canvas_h < 2: return
+        if image_data is None or canvas_w < 2 or canvas_h < 2: return None
 
         img_h, img_w = image_data.shape[:2]; aspect = img_w / img_h
         new_w, new_h = (canvas_w, int(canvas_w / aspect)) if (canvas_w / aspect) <= canvas_h else (int(canvas_h * aspect), canvas_h)
-        if new_w < 1 or new_h < 1: return
-        
-        resized_img = cv2.resize(image_data, (int(new_w), int(new_h)), interpolation=cv2.INTER_AREA)
-        photo_img = ImageTk.PhotoImage(image=Image.fromarray(resized_img))
-        
-        if image_type == 'original': self.tk_original_image = photo_img
-        else: self.tk_processed_image = photo_img
-            
+        if new_w < 1 or new_h < 1: return None
+        return int(new_w), int(new_h)
+
+    def display_image(self, canvas, image_type, info_label, lut=None):
+        size = self._fit_size(canvas, self.original_image)
+        if size is None: return
+        self._paint_image(self.pyramid.display(size, lut, self.histogram_service.max_value), canvas, image_type, info_label)
+
+    def _paint_image(self, display_img, canvas, image_type, info_label):
+        canvas_w, canvas_h = canvas.winfo_width(), canvas.winfo_height()
+        new_h, new_w = display_img.shape[:2]
         x, y = (canvas_w - new_w) / 2, (canvas_h - new_h) / 2
-        canvas.create_image(x, y, anchor=tk.NW, image=photo_img)
-        info_label.config(text=f"Dimensions: {img_w} x {img_h} px")
+        pil_img = Image.fromarray(display_img)
 
-    def calculate_histogram_fast(self, image):
-        if image.size > HISTOGRAM_PIXEL_LIMIT:
-            pixels, is_sampled = np.random.choice(image.ravel(), HISTOGRAM_PIXEL_LIMIT, replace=False), True
+        # Reuse the PhotoImage and canvas item when the size is unchanged
+        photo_img = self.tk_original_image if image_type == 'original' else self.tk_processed_image
+        item = self.canvas_items.get(image_type)
+        if photo_img is not None and item is not None and (photo_img.width(), photo_img.height()) == (new_w, new_h):
+            photo_img.paste(pil_img)
+            canvas.coords(item, x, y)
         else:
-            pixels, is_sampled = image.ravel(), False
-        counts, bins = np.histogram(pixels, bins=256, range=[0, 256])
-        return counts, bins, is_sampled
+            photo_img = ImageTk.PhotoImage(image=pil_img)
+            if image_type == 'original': self.tk_original_image = photo_img
+            else: self.tk_processed_image = photo_img
+            canvas.delete("all")
+            self.canvas_items[image_type] = canvas.create_image(x, y, anchor=tk.NW, image=photo_img)
+        img_h, img_w = self.original_image.shape[:2]
+        info_label.config(text=f"Dimensions: {img_w} x {img_h} px")
 
     def update_histograms(self):
-        if self.original_image is not None:
-            counts, bins, sampled = self.calculate_histogram_fast(self.original_image)
-            self.plot_histogram(self.hist_original_frame, counts, bins, ACCENT_COLOR, "Original Histogram", sampled)
-        if self.processed_image is not None:
-            counts, bins, sampled = self.calculate_histogram_fast(self.processed_image)
-            self.plot_histogram(self.hist_processed_frame, counts, bins, ERROR_COLOR, "Enhanced Histogram", sampled)
-
-    def plot_histogram(self, parent_frame, counts, bins, color, title, sampled):
-        for widget in parent_frame.winfo_children(): widget.destroy()
-        parent_frame['text'] = title + (" (Sampled)" if sampled else "")
-        fig, ax = plt.subplots(facecolor=FRAME_COLOR)
-        ax.set_facecolor(BG_COLOR)
-        ax.bar(bins[:-1], counts, width=1, color=color)
-        ax.set_xlim([0, 255]); ax.tick_params(colors=TEXT_COLOR, which='both')
-        ax.set_xlabel("Pixel Intensity", color=TEXT_COLOR, fontsize=8)
-        ax.set_ylabel("Frequency", color=TEXT_COLOR, fontsize=8)
-        ax.tick_params(axis='both', which='major', labelsize=8)
-        ax.grid(True, linestyle='--', alpha=0.2); fig.tight_layout(pad=0.5)
-        canvas = FigureCanvasTkAgg(fig, master=parent_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        plt.close(fig)
+        # The enhanced histogram arrives with each worker result
+        if self.histogram_service is None: return
+        self.plot_histogram(self.hist_original_frame, self.histogram_service.source_counts, ACCENT_COLOR, "Original Histogram")
+
+    def plot_histogram(self, parent_frame, counts, color, title, rendered=None):
+        parent_frame['text'] = title
+        view = self.hist_views[parent_frame]
+        view["counts"], view["color"] = counts, color
+        canvas = view["canvas"]
+        if rendered is not None and rendered.shape[:2] == (canvas.winfo_height(), canvas.winfo_width()):
+            self._paint_histogram(view, rendered)
+        else:
+            self.redraw_histogram(parent_frame)
+
+    def _histogram_max_value(self):
+        # 8-bit images are always plotted over 0-255; high-bit images over their own range
+        if self.original_image is None or self.original_image.dtype == np.uint8: return 255
+        return self.histogram_service.max_value
+
+    def redraw_histogram(self, parent_frame):
+        view = self.hist_views[parent_frame]
+        canvas = view["canvas"]
+        canvas_w, canvas_h = canvas.winfo_width(), canvas.winfo_height()
+        if view["counts"] is None or canvas_w < 2 or canvas_h < 2: return
+
+        rendered = histogram_render.render_histogram(view["counts"], canvas_w, canvas_h, color=view["color"], max_value=self._histogram_max_value())
+        self._paint_histogram(view, rendered)
+
+    def _paint_histogram(self, view, rendered):
+        rendered = Image.fromarray(rendered)
+        photo = view["photo"]
+        if photo is not None and (photo.width(), photo.height()) == rendered.size:
+            photo.paste(rendered)
+        else:
+            view["photo"] = ImageTk.PhotoImage(image=rendered)
+            view["canvas"].itemconfig(view["item"], image=view["photo"])
 
     def load_image(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.tif;*.dcm")])
+        file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.tif;*.tiff;*.dcm")])
         if not file_path: return
         try:
-            img = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
-            if img is None: raise ValueError("File is not a valid image.")
+            img, max_value = image_io.read_image_with_max(file_path)
             self.original_image = img
+            self.histogram_service = histograms.HistogramService(img, max_value)
+            self.pyramid = DisplayPyramid(img)
+            lut_max = 255 if img.dtype == np.uint8 else max_value
+            self.clahe_model = clahe.ClaheModel(img, lut_max)
+            self.setup_window_range(lut_max, image_io.header_window(file_path))
             self.original_filename = os.path.basename(file_path)
-            self.lut_cache.clear(); self.last_canvas_sizes = {}
             self.reset_image()
             self.save_button['state'] = tk.NORMAL
             self.reset_button['state'] = tk.NORMAL
@@ -243,7 +437,7 @@ class ImageEnhancerApp:
             messagebox.showerror("Error", f"Failed to load image: {e}")
 
     def save_output(self):
-        if self.processed_image is None or self.original_filename is None:
+        if self.original_image is None or self.original_filename is None:
             messagebox.showwarning("Warning", "No enhanced image to save.")
             return
         technique = self.technique_var.get()
@@ -252,45 +446,53 @@ class ImageEnhancerApp:
             return
 
         base_name, _ = os.path.splitext(self.original_filename)
-        suffix = f"{technique}_gamma{self.gamma_var.get():.2f}" if technique == "gamma" else technique
-            
+        param = self.current_param(technique)
+        # Same names as the CLI gives the same settings
+        suffix = api.output_suffix(technique, param)
+
         new_image_filename = f"{base_name}_{suffix}.png"
         new_hist_filename = f"{base_name}_{suffix}_hist.png"
         image_save_path = os.path.join(OUTPUT_DIR, new_image_filename)
         hist_save_path = os.path.join(OUTPUT_DIR, new_hist_filename)
 
         try:
-            cv2.imwrite(image_save_path, self.processed_image)
-            self.save_histogram_to_file(self.processed_image, hist_save_path, ERROR_COLOR, "Enhanced Histogram")
+            # Only screen-sized buffers are processed interactively; the full-resolution output is made here
+            if technique == "clahe":
+                processed_image = self.clahe_model.apply(*param)
+                counts = histograms.compute_histogram(processed_image)
+            else:
+                lut = self.histogram_service.lut_for(technique, param)
+                processed_image = transforms.apply_lut(self.original_image, lut)
+                counts = self.histogram_service.processed_counts(lut)
+            cv2.imwrite(image_save_path, processed_image)
+            self.save_histogram_to_file(processed_image, hist_save_path, ERROR_COLOR, "Enhanced Histogram", counts)
             messagebox.showinfo("Success", f"Outputs saved to '{OUTPUT_DIR}' folder:\n- {new_image_filename}\n- {new_hist_filename}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save files: {e}")
 
-    def save_histogram_to_file(self, image_data, file_path, color, title):
-        counts, bins, sampled = self.calculate_histogram_fast(image_data)
-        full_title = title + (" (Sampled)" if sampled else "")
-
-        fig, ax = plt.subplots(facecolor=FRAME_COLOR, figsize=(6, 4))
-        fig.suptitle(full_title, color=TEXT_COLOR, fontsize=12)
-        ax.set_facecolor(BG_COLOR)
-        ax.bar(bins[:-1], counts, width=1.0, color=color)
-        ax.set_xlim([0, 255]); ax.tick_params(colors=TEXT_COLOR, which='both')
-        ax.set_xlabel("Pixel Intensity", color=TEXT_COLOR)
-        ax.set_ylabel("Frequency", color=TEXT_COLOR)
-        ax.grid(True, linestyle='--', alpha=0.2)
-        fig.tight_layout(rect=[0, 0, 1, 0.95])
-        
-        fig.savefig(file_path, facecolor=FRAME_COLOR, dpi=150)
-        plt.close(fig)
+    def save_histogram_to_file(self, image_data, file_path, color, title, counts=None):
+        if not histogram_render.save_histogram_image(image_data, file_path, title, color=color, counts=counts, max_value=self._histogram_max_value()):
+            raise IOError(f"Could not write histogram to {file_path}")
+
+    def setup_window_range(self, max_value: int, header_window: Optional[tuple] = None):
+        """Fits the window sliders to the image's range and starts from the DICOM window, if there is one."""
+        center, width = header_window or ((max_value + 1) / 2, max_value + 1)
+        self.center_slider.configure(from_=0, to=max_value)
+        self.width_slider.configure(from_=1, to=max_value + 1)
+        self.center_var.set(center)
+        self.width_var.set(width)
 
     def reset_image(self):
         if self.original_image is not None:
             self.technique_var.set("None")
-            self.last_canvas_sizes = {}
-            self.display_image(self.original_image, self.original_canvas, 'original', self.original_info_label)
+            self.display_image(self.original_canvas, 'original', self.original_info_label)
+            self.update_histograms()
             self.apply_enhancement()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = ImageEnhancerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    if os.environ.get(METRICS_ENV):
+        print(app.frame_latency.format_table())
+        print(app.frame_metrics.format_table())
\ No newline at end of file
@@ -0,0 +1,274 @@
+import os
+import argparse
+import glob
+import itertools
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+try:
+    import cv2
+    import numpy as np
+    import enhancement
+    from enhancement import clahe, histogram_render, histograms, image_io, tiled, transforms
+    from enhancement.pyramid import DisplayPyramid
+except ImportError as e:
+    print(f"--> Error: A required library is missing: {e.name}")
+    print("--> Please install the necessary libraries by running this command:")
+    print("pip install opencv-python numpy")
+    sys.exit(1)
+
+# --- Constants ---
+DATASET_DIRS = ("dataset/NORMAL", "dataset/Pneumonia")
+CASES = ("bundled", "synthetic_8bit", "synthetic_16bit")
+DISPLAY_SIZE = (800, 600)
+BENCH_GAMMA = 0.7
+DEFAULT_THRESHOLD = 0.10
+# Runs that differ in these settings time different work and cannot be compared
+COMPARED_META = ("synthetic_size", "repeat", "cases", "benchmarks")
+
+def load_bundled_images() -> list:
+    """Returns (path, image) for every bundled dataset image."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    images = []
+    for directory in DATASET_DIRS:
+        for path in sorted(glob.glob(os.path.join(script_dir, directory, "*.jpeg"))):
+            images.append((path, image_io.read_image(path)))
+    return images
+
+def make_synthetic_image(size: int, high_bit: bool) -> np.ndarray:
+    """A smooth radiograph-like gradient with noise, 8-bit or 12-bit-in-16."""
+    rng = np.random.default_rng(0)
+    max_value = 4095 if high_bit else 255
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    base = 0.5 + 0.35 * np.sin(3 * x) * np.cos(2 * y)
+    noisy = np.clip(base + rng.normal(0, 0.05, (size, size)).astype(np.float32), 0, 1)
+    return (noisy * max_value).astype(np.uint16 if high_bit else np.uint8)
+
+def build_case(case: str, size: int, tmp_dir: str) -> list:
+    """Returns (path, image, max_value) items; synthetic images are written to tmp_dir so decode can be timed."""
+    if case == "bundled":
+        return [(path, image, 255) for path, image in load_bundled_images()]
+    high_bit = case == "synthetic_16bit"
+    image = make_synthetic_image(size, high_bit)
+    path = os.path.join(tmp_dir, f"{case}.png")
+    cv2.imwrite(path, image)
+    return [(path, image, 4095 if high_bit else 255)]
+
+def benchmark_functions(tmp_dir: str) -> dict:
+    """Each entry takes (path, image, max_value) and performs one operation.
+
+    An entry's optional ``setup(items)`` attribute runs before timing, for state
+    the measured operation reuses (the GUI builds it once per loaded image).
+    """
+    out_png = os.path.join(tmp_dir, "out.png")
+    hist_png = os.path.join(tmp_dir, "hist.png")
+    models = {}
+    pyramids = {}
+    # One more clip limit than the model caches, so every call rebuilds the tile tables
+    clip_limits = itertools.cycle(np.linspace(1.0, 5.0, clahe.HISTOGRAM_CACHE_SIZE + 1))
+
+    def histogram_service(path, image, max_value):
+        service = histograms.HistogramService(image, max_value)
+        service.processed_counts(service.lut_for("gamma", BENCH_GAMMA))
+
+    def save_histogram(path, image, max_value):
+        histogram_render.save_histogram_image(image, hist_png, "Enhanced Histogram", max_value=max_value)
+
+    def build_models(items):
+        for path, image, max_value in items:
+            models[path] = (clahe.ClaheModel(image, max_value), DisplayPyramid(image))
+            models[path][0].tile_histograms(clahe.DEFAULT_TILES)
+
+    def clahe_retune(path, image, max_value):
+        # The GUI's slider path: tile histograms cached, new clip limit, screen-sized preview
+        model, pyramid = models[path]
+        model.apply_resized(pyramid.resized(DISPLAY_SIZE), next(clip_limits))
+
+    def build_pyramids(items):
+        for path, image, max_value in items:
+            pyramids[path] = DisplayPyramid(image)
+
+    def display(path, image, max_value):
+        # A redraw: the pyramid is built once when the image is loaded
+        pyramids[path].display(DISPLAY_SIZE, transforms.gamma_lut(BENCH_GAMMA, max_value if image.dtype != np.uint8 else 255), max_value)
+
+    clahe_retune.setup = build_models
+    display.setup = build_pyramids
+
+    return {
+        "histogram_equalization": lambda path, image, max_value: transforms.apply_histogram_equalization(image, max_value),
+        "gamma_correction": lambda path, image, max_value: transforms.apply_gamma_correction(image, BENCH_GAMMA, max_value),
+        "clahe": lambda path, image, max_value: clahe.apply_clahe(image, max_value=max_value),
+        "clahe_retune": clahe_retune,
+        "window": lambda path, image, max_value: transforms.apply_lut(
+            image, transforms.window_lut(*transforms.resolve_window(transforms.WindowParams(), max_value), max_value=max_value)),
+        "histogram": lambda path, image, max_value: histograms.compute_histogram(image),
+        "histogram_service": histogram_service,
+        "save_histogram": save_histogram,
+        "decode": lambda path, image, max_value: image_io.read_image(path),
+        "encode_png": lambda path, image, max_value: cv2.imwrite(out_png, image),
+        "display_image": display,
+    }
+
+def time_benchmark(func, items: list, repeat: int) -> dict:
+    """Times func over every item, repeat times, after its setup and one warm-up pass.
+
+    peak_traced_bytes is the peak of Python and NumPy allocations during one call, as seen by
+    tracemalloc; buffers OpenCV allocates itself (cv2.imread, cv2.LUT results) are not counted.
+    """
+    setup = getattr(func, "setup", None)
+    if setup is not None:
+        setup(items)
+    for item in items[:1]:
+        func(*item)
+    latencies, pixels = [], 0
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            func(*item)
+            latencies.append(time.perf_counter() - start)
+            pixels += item[1].size
+
+    # One extra pass under tracemalloc so tracing overhead stays out of the timings
+    tracemalloc.start()
+    for item in items[:1]:
+        func(*item)
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    total = latencies.sum()
+    return {
+        "calls": int(latencies.size),
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "images_per_s": float(latencies.size / total) if total > 0 else None,
+        "mp_per_s": float(pixels / total / 1e6) if total > 0 else None,
+        "peak_traced_bytes": int(peak_traced),
+    }
+
+def run_benchmarks(cases: list, names: list, size: int, repeat: int) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        functions = benchmark_functions(tmp_dir)
+        for case in cases:
+            items = build_case(case, size, tmp_dir)
+            if not items:
+                print(f"--> Skipping '{case}': no images found", file=sys.stderr)
+                continue
+            for name in names:
+                stats = time_benchmark(functions[name], items, repeat)
+                results.append({"case": case, "name": name, "images": len(items), **stats})
+                print(f"--> {case:16s} {name:24s} p50 {stats['p50_ms']:9.3f} ms  p99 {stats['p99_ms']:9.3f} ms  "
+                      f"{stats['mp_per_s']:9.1f} MP/s", file=sys.stderr)
+    return {
+        "meta": {
+            "version": enhancement.__version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "synthetic_size": size,
+            "repeat": repeat,
+            "cases": list(cases),
+            "benchmarks": list(names),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            # The high-water mark of the whole run, not of any one benchmark
+            "peak_rss_bytes": tiled.peak_rss_bytes(),
+        },
+        "results": results,
+    }
+
+def meta_mismatches(current: dict, baseline: dict) -> list:
+    """Returns (setting, baseline value, current value) for every COMPARED_META setting that differs."""
+    current_meta, baseline_meta = current.get("meta", {}), baseline.get("meta", {})
+    return [(key, baseline_meta.get(key), current_meta.get(key)) for key in COMPARED_META
+            if baseline_meta.get(key) != current_meta.get(key)]
+
+def compare_results(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Returns one row per benchmark present in both runs; 'regressed' is set when p50 slowed by more than threshold."""
+    baseline_by_key = {(r["case"], r["name"]): r for r in baseline.get("results", [])}
+    rows = []
+    for result in current["results"]:
+        base = baseline_by_key.get((result["case"], result["name"]))
+        # A different number of images (the bundled dataset changed) is different work
+        if base is None or not base["p50_ms"] or base.get("images") != result["images"]:
+            continue
+        ratio = result["p50_ms"] / base["p50_ms"]
+        rows.append({"case": result["case"], "name": result["name"], "baseline_p50_ms": base["p50_ms"],
+                     "p50_ms": result["p50_ms"], "ratio": ratio, "regressed": ratio > 1 + threshold})
+    return rows
+
+def print_comparison(rows: list, threshold: float):
+    print(f"\n--- Comparison against baseline (threshold {threshold:.0%}) ---", file=sys.stderr)
+    for row in rows:
+        flag = "SLOWER" if row["regressed"] else "ok"
+        print(f"{row['case']:16s} {row['name']:24s} {row['baseline_p50_ms']:9.3f} -> {row['p50_ms']:9.3f} ms  "
+              f"x{row['ratio']:.2f}  {flag}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the enhancement, histogram, I/O and display hot paths.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--cases", type=str, default=",".join(CASES), help=f"Comma-separated cases to run. (Default: {','.join(CASES)})")
+    parser.add_argument("--only", type=str, help="Comma-separated benchmark names to run. (Default: all)")
+    parser.add_argument("--size", type=int, default=4096, help="Side length of the synthetic images. (Default: 4096)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes over each case. (Default: 5)")
+    parser.add_argument("-o", "--output", type=str, help="Write the JSON results to this file instead of stdout.")
+    parser.add_argument("--compare", type=str, help="A previous JSON result to compare against; exits with status 1 on a slowdown.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Allowed p50 slowdown before flagging, as a fraction. (Default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args()
+
+    names = list(benchmark_functions("").keys())
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    selected = [n.strip() for n in args.only.split(",")] if args.only else names
+    for case in cases:
+        if case not in CASES:
+            parser.error(f"Unknown case '{case}'. Choose from: {', '.join(CASES)}")
+    for name in selected:
+        if name not in names:
+            parser.error(f"Unknown benchmark '{name}'. Choose from: {', '.join(names)}")
+    if args.repeat < 1:
+        parser.error("The --repeat value must be at least 1.")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        # Check before running: the settings are known from the arguments alone
+        planned = {"meta": {"synthetic_size": args.size, "repeat": args.repeat, "cases": cases, "benchmarks": selected}}
+        mismatches = meta_mismatches(planned, baseline)
+        if mismatches:
+            print(f"--> Error: cannot compare against {args.compare}; it was run with different settings:", file=sys.stderr)
+            for key, base_value, value in mismatches:
+                print(f"-->   {key}: baseline {base_value}, this run {value}", file=sys.stderr)
+            print("--> Re-run with the baseline's --size, --repeat, --cases and --only, or record a new baseline.",
+                  file=sys.stderr)
+            sys.exit(2)
+
+    report = run_benchmarks(cases, selected, args.size, args.repeat)
+
+    regressed = False
+    if baseline is not None:
+        rows = compare_results(report, baseline, args.threshold)
+        print_comparison(rows, args.threshold)
+        report["comparison"] = {"baseline": args.compare, "threshold": args.threshold, "rows": rows}
+        regressed = any(row["regressed"] for row in rows)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"--> Results written to: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
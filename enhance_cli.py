@@ -1,57 +1,731 @@
+from __future__ import annotations
+
 import os
 import argparse
+import glob
+import json
+import logging
 import sys
-try:
-    import cv2
-    import numpy as np
-    import matplotlib.pyplot as plt
-except ImportError as e:
-    print(f"--> Error: A required library is missing: {e.name}")
-    print("--> Please install the necessary libraries by running this command:")
-    print("pip install opencv-python numpy matplotlib")
-    sys.exit(1)
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from enhancement import metrics, pipeline, result_cache
+
+# OpenCV, NumPy and the modules that need them are imported by load_dependencies(), which main()
+# calls once the arguments are valid and every function that uses them calls on entry. --help and
+# usage errors return immediately, and `import enhance_cli` works as a library without main().
+cv2 = np = None
+api = clahe = histograms = image_io = tiled = transforms = None
+
+def load_dependencies():
+    """Imports OpenCV, NumPy and the array-processing modules on first use."""
+    global cv2, np, api, clahe, histograms, image_io, tiled, transforms
+    if cv2 is not None:
+        return
+    try:
+        import cv2
+        import numpy as np
+        from enhancement import api, clahe, histograms, image_io, tiled, transforms
+    except ImportError as e:
+        print(f"--> Error: A required library is missing: {e.name}")
+        print("--> Please install the necessary libraries by running this command:")
+        print("pip install opencv-python numpy")
+        sys.exit(1)
 
 # --- Constants ---
-BG_COLOR = "#2e2e2e"
-FRAME_COLOR = "#3c3c3c"
-TEXT_COLOR = "#dcdcdc"
 ERROR_COLOR = "#e74c3c"
 DEFAULT_OUTPUT_DIR = "cli_output"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".dcm")
+TECHNIQUES = ("hist_eq", "gamma", "clahe", "window")
+POINT_TECHNIQUES = ("hist_eq", "gamma", "window")  # The ones --tiled can process strip by strip
+VOI_FUNCTIONS = ("linear", "sigmoid")
+METRICS_FORMATS = ("text", "json")
+OUTPUT_FORMATS = ("png", "tiff", "bmp", "npy")
+DEFAULT_READERS = 4  # Enough overlapping reads to hide the latency of network storage
+DEFAULT_WRITERS = 2
 
-def apply_histogram_equalization(image: np.ndarray) -> np.ndarray:
-    """Applies Histogram Equalization to a grayscale image."""
-    print("--> Applying Histogram Equalization...")
-    return cv2.equalizeHist(image)
+log = logging.getLogger("enhance_cli")
 
-def apply_gamma_correction(image: np.ndarray, gamma: float) -> np.ndarray:
-    """Applies Power-Law (Gamma) transformation to a grayscale image."""
-    if gamma <= 0:
-        raise ValueError("Gamma value must be greater than zero.")
-    
-    print(f"--> Applying Gamma Correction with gamma={gamma:.2f}...")
-    inv_gamma = 1.0 / gamma
-    table = np.array([((i / 255.0) ** inv_gamma) * 255 for i in np.arange(256)]).astype("uint8")
-    return cv2.LUT(image, table)
-
-def save_histogram_to_file(image_data: np.ndarray, file_path: str, title: str):
-    """Calculates and saves the histogram of an image to a file."""
-    print(f"--> Generating and saving histogram to: {file_path}")
-    
-    counts, bins = np.histogram(image_data.ravel(), bins=256, range=[0, 256])
-
-    fig, ax = plt.subplots(facecolor=FRAME_COLOR, figsize=(6, 4))
-    fig.suptitle(title, color=TEXT_COLOR, fontsize=12)
-    ax.set_facecolor(BG_COLOR)
-    ax.bar(bins[:-1], counts, width=1.0, color=ERROR_COLOR)
-    ax.set_xlim([0, 255])
-    ax.tick_params(colors=TEXT_COLOR, which='both')
-    ax.set_xlabel("Pixel Intensity", color=TEXT_COLOR)
-    ax.set_ylabel("Frequency", color=TEXT_COLOR)
-    ax.grid(True, linestyle='--', alpha=0.2)
-    fig.tight_layout(rect=[0, 0, 1, 0.95])
-    
-    fig.savefig(file_path, facecolor=FRAME_COLOR, dpi=150)
-    plt.close(fig)
+def configure_logging(quiet: bool = False, stream=None):
+    """Sends progress messages to stream (stdout by default). Quiet keeps only errors."""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.handlers[:] = [handler]
+    log.setLevel(logging.ERROR if quiet else logging.INFO)
+    log.propagate = False
+
+def save_histogram_to_file(image_data: np.ndarray, file_path: str, title: str, counts: np.ndarray = None, max_value: int = 255):
+    """Calculates and saves the histogram of an image to a file. Precomputed counts skip the pixel pass."""
+    from enhancement import histogram_render
+
+    log.info("--> Generating and saving histogram to: %s", file_path)
+    with metrics.stage("histogram_render"):
+        if not histogram_render.save_histogram_image(image_data, file_path, title, color=ERROR_COLOR, counts=counts, max_value=max_value):
+            raise IOError(f"OpenCV could not write: {file_path}")
+    metrics.count("bytes_written", os.path.getsize(file_path))
+
+def get_suffix(technique: str, param) -> str:
+    """Returns the output filename suffix for a technique and its parameter (the GUI names its saves the same way)."""
+    load_dependencies()
+    return api.output_suffix(technique, param)
+
+def describe_variant(technique: str, param) -> str:
+    load_dependencies()
+    if technique == "hist_eq":
+        return "Histogram Equalization"
+    if technique == "clahe":
+        return "CLAHE (clip limit %g, %dx%d tiles)" % (param.clip_limit, *param.tiles)
+    if technique == "window":
+        return "Window/Level (%s, center %s, width %s)" % (param.function, api.format_window_value(param.center),
+                                                            api.format_window_value(param.width))
+    return "Gamma Correction with gamma=%.2f" % param
+
+def parse_techniques(value: str) -> list:
+    """Parses a comma-separated technique list such as 'hist_eq,gamma'."""
+    techniques = [t.strip() for t in value.split(",") if t.strip()]
+    for technique in techniques:
+        if technique not in TECHNIQUES:
+            raise argparse.ArgumentTypeError(f"invalid technique '{technique}' (choose from {', '.join(TECHNIQUES)})")
+    if not techniques:
+        raise argparse.ArgumentTypeError("at least one technique is required")
+    return list(dict.fromkeys(techniques))
+
+def parse_gamma_values(value: str) -> list:
+    """Parses gamma values: a number, a comma-separated list, or an inclusive start:stop:step range."""
+    load_dependencies()
+    gammas = []
+    try:
+        for part in value.split(","):
+            part = part.strip()
+            if ":" in part:
+                start, stop, step = (float(x) for x in part.split(":"))
+                if not all(np.isfinite((start, stop, step))) or step <= 0 or stop < start:
+                    raise argparse.ArgumentTypeError(f"invalid gamma range '{part}'")
+                count = int((stop - start) / step + 1e-9) + 1
+                gammas.extend(start + i * step for i in range(count))
+            elif part:
+                gammas.append(float(part))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid gamma value '{value}'")
+    try:
+        # Values that collapse to the same LUT and filename are only produced once
+        return list(dict.fromkeys(transforms.quantize_gamma(g) for g in gammas))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def get_variants(techniques: list, gammas: list, clahe_params=None, window=None) -> list:
+    """Expands techniques and their parameters into the (technique, param) pairs to produce.
+
+    param is the gamma value for 'gamma', a ClaheParams for 'clahe', a WindowParams for
+    'window' (center and width None until read from each image) and None for 'hist_eq'.
+    """
+    load_dependencies()
+    gammas = list(dict.fromkeys(transforms.quantize_gamma(g) for g in gammas))
+    variants = []
+    for technique in techniques:
+        if technique == "gamma":
+            variants.extend(("gamma", g) for g in gammas)
+        elif technique == "clahe":
+            variants.append(("clahe", clahe_params or clahe.ClaheParams(clahe.DEFAULT_CLIP_LIMIT, clahe.DEFAULT_TILES)))
+        elif technique == "window":
+            variants.append(("window", window or transforms.WindowParams()))
+        else:
+            variants.append((technique, None))
+    return variants
+
+def prepare_output_dir(output_dir: str) -> str:
+    """Resolves the output directory next to this script and creates it if needed."""
+    # Get the directory of the script to create the output folder there
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    output_path = os.path.join(script_dir, output_dir)
+
+    if not os.path.exists(output_path):
+        os.makedirs(output_path, exist_ok=True)
+        log.info("--> Created output directory: '%s'", output_path)
+    else:
+        log.info("--> Output directory already exists: '%s'", output_path)
+    return output_path
+
+def collect_input_files(inputs: list, manifest: str = None) -> list:
+    """Expands files, directories (recursively), glob patterns and an optional manifest into image paths."""
+    candidates = list(inputs)
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    candidates.append(line)
+
+    files, seen = [], set()
+    def add(path):
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            files.append(path)
+
+    for entry in candidates:
+        if os.path.isdir(entry):
+            for dirpath, dirnames, filenames in os.walk(entry):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        add(os.path.join(dirpath, name))
+        elif glob.has_magic(entry):
+            for match in sorted(glob.glob(entry, recursive=True)):
+                if os.path.isfile(match) and match.lower().endswith(IMAGE_EXTENSIONS):
+                    add(match)
+        else:
+            # Plain files are kept even if missing so they show up as failures in the summary
+            add(entry)
+    return files
+
+def output_names(files: list) -> dict:
+    """Maps each input path to the base name of its outputs, relative to the output directory.
+
+    Inputs keep their path below the directory all of them share, so x/a.jpeg and
+    y/a.jpeg write x/a_* and y/a_* instead of overwriting each other. Files that
+    differ only in their extension keep it in the name (a_png_*, a_jpg_*).
+    """
+    if not files:
+        return {}
+    try:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+        names = {f: os.path.splitext(os.path.relpath(os.path.abspath(f), root))[0] for f in files}
+    except ValueError:
+        # No common directory (different Windows drives): fall back to flat names
+        names = {f: os.path.splitext(os.path.basename(f))[0] for f in files}
+    taken = Counter(os.path.normcase(name) for name in names.values())
+    return {f: name if taken[os.path.normcase(name)] == 1 else f"{name}_{os.path.splitext(f)[1][1:].lower()}"
+            for f, name in names.items()}
+
+def default_name(filepath: str) -> str:
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+def output_file_name(name: str, suffix: str, output_format: image_io.OutputFormat) -> str:
+    """Returns the enhanced image's path relative to the output directory."""
+    return f"{name}_{suffix}.{output_format.extension}"
+
+def output_file_paths(output_path: str, name: str, suffix: str, output_format: image_io.OutputFormat) -> tuple:
+    """Returns (image path, histogram path) for one variant, creating the name's subdirectory if needed."""
+    base = os.path.join(output_path, name)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    return os.path.join(output_path, output_file_name(name, suffix, output_format)), f"{base}_{suffix}_hist.png"
+
+def resolve_windows(filepath: str, variants: list, max_value: int) -> list:
+    """Fills in window variants left without a center or width, from the DICOM header or else the full range."""
+    load_dependencies()
+    if not any(technique == "window" and None in param[:2] for technique, param in variants):
+        return variants
+    header = image_io.header_window(filepath)
+    return [(technique, transforms.resolve_window(param, max_value, header) if technique == "window" else param)
+            for technique, param in variants]
+
+def save_variant(processed_image: np.ndarray, output_path: str, name: str, suffix: str,
+                 counts: np.ndarray = None, max_value: int = 255, with_histograms: bool = True,
+                 output_format: image_io.OutputFormat = None) -> tuple:
+    """Writes one enhanced image, and its histogram plot unless disabled. Returns the saved paths."""
+    load_dependencies()
+    output_format = output_format or image_io.OutputFormat()
+    image_save_path, hist_save_path = output_file_paths(output_path, name, suffix, output_format)
+
+    with metrics.stage("encode"):
+        encoded = image_io.encode_image(processed_image, output_format)
+    with metrics.stage("write"):
+        metrics.count("bytes_written", image_io.write_bytes(image_save_path, encoded))
+    log.info("--> Saved enhanced image to: %s", image_save_path)
+    if not with_histograms:
+        return (image_save_path,)
+
+    save_histogram_to_file(processed_image, hist_save_path, f"Enhanced Histogram ({suffix})",
+                           counts=counts, max_value=max_value)
+    return image_save_path, hist_save_path
+
+def decode_file(filepath: str) -> tuple:
+    """Reads one image at its native bit depth. Returns (image, max_value)."""
+    load_dependencies()
+    with metrics.stage("decode"):
+        image, max_value = image_io.read_image_with_max(filepath)
+    metrics.count("bytes_read", os.path.getsize(filepath))
+    metrics.count("pixels", image.size)
+    return image, max_value
+
+def transform_variants(filepath: str, original_image: np.ndarray, max_value: int, variants: list,
+                       with_histograms: bool = True):
+    """Applies every (technique, param) variant to a decoded image.
+
+    Yields (index into variants, suffix, processed image, processed counts or None, max_value)
+    one variant at a time, so only one output is held before it is written.
+    """
+    load_dependencies()
+    lut_max = 255 if original_image.dtype == np.uint8 else max_value
+    resolved = resolve_windows(filepath, variants, lut_max)
+    suffixes = [get_suffix(technique, param) for technique, param in variants]
+
+    # Everything but CLAHE is a point transform, so the output histogram follows from the source one.
+    # Gamma or window alone without histogram output never needs the pixel count.
+    point = [i for i, (technique, _) in enumerate(variants) if technique != "clahe"]
+    histogram = None
+    with metrics.stage("histogram"):
+        if point and (with_histograms or any(variants[i][0] == "hist_eq" for i in point)):
+            histogram = histograms.HistogramService(original_image, max_value)
+            luts = [histogram.lut_for(*resolved[i]) for i in point]
+        else:
+            luts = [transforms.window_lut(*resolved[i][1], max_value=lut_max) if variants[i][0] == "window"
+                    else transforms.gamma_lut(resolved[i][1], lut_max) for i in point]
+
+    for i, lut in zip(point, luts):
+        log.info("--> Applying %s...", describe_variant(*resolved[i]))
+        with metrics.stage("transform"):
+            processed_image = transforms.apply_lut(original_image, lut)
+        counts = None
+        if with_histograms:
+            with metrics.stage("histogram"):
+                counts = histogram.processed_counts(lut)
+        yield i, suffixes[i], processed_image, counts, lut_max
+
+    # CLAHE depends on each pixel's neighbourhood. The model hands 8-bit and full-range 16-bit images to
+    # cv2.createCLAHE; for other depths it shares the tile histograms between variants with the same grid
+    model = None
+    for i, (technique, param) in enumerate(variants):
+        if technique != "clahe":
+            continue
+        log.info("--> Applying %s...", describe_variant(technique, param))
+        with metrics.stage("transform"):
+            model = model or clahe.ClaheModel(original_image, lut_max)
+            processed_image = model.apply(param.clip_limit, param.tiles)
+        counts = None
+        if with_histograms:
+            with metrics.stage("histogram"):
+                counts = histograms.compute_histogram(processed_image)
+        yield i, suffixes[i], processed_image, counts, lut_max
+
+def enhance_file(filepath: str, variants: list, output_path: str, memory_limit: int = None,
+                 with_histograms: bool = True, output_format: image_io.OutputFormat = None, name: str = None) -> list:
+    """Reads one image once, applies every (technique, param) variant and saves each with its histogram.
+
+    Returns the saved paths per variant: (image, histogram), or (image,) without histograms.
+    name is the outputs' base name under output_path (see output_names); it defaults to
+    the input's file name. With a memory_limit (bytes) each variant is processed in strips
+    instead.
+    """
+    load_dependencies()
+    name = name or default_name(filepath)
+    if memory_limit:
+        return [enhance_file_tiled(filepath, technique, param, output_path, memory_limit, with_histograms, output_format, name)
+                for technique, param in variants]
+
+    # 16-bit PNG/TIFF and DICOM inputs keep their bit depth all the way to the output
+    original_image, max_value = decode_file(filepath)
+    saved = [None] * len(variants)
+    for i, suffix, processed_image, counts, lut_max in transform_variants(filepath, original_image, max_value, variants, with_histograms):
+        saved[i] = save_variant(processed_image, output_path, name, suffix, counts, lut_max, with_histograms, output_format)
+    return saved
+
+def enhance_file_tiled(filepath: str, technique: str, param, output_path: str, memory_limit: int,
+                       with_histograms: bool = True, output_format: image_io.OutputFormat = None,
+                       name: str = None) -> tuple:
+    """Strip-wise variant of enhance_file with a fixed memory ceiling (see tiled.enhance_tiled for the exceptions)."""
+    load_dependencies()
+    output_format = output_format or image_io.OutputFormat()
+    suffix = get_suffix(technique, param)
+    image_save_path, hist_save_path = output_file_paths(output_path, name or default_name(filepath), suffix, output_format)
+
+    log.info("--> Processing in strips (memory limit %.0f MB)...", memory_limit / 2**20)
+    stats = tiled.enhance_tiled(filepath, image_save_path, technique, param, memory_limit=memory_limit,
+                                with_histogram=with_histograms, output_format=output_format)
+    log.info("--> Saved enhanced image to: %s (%d strips of %d rows)", image_save_path, stats["strips"], stats["strip_rows"])
+    if not with_histograms:
+        return (image_save_path,)
+
+    save_histogram_to_file(None, hist_save_path, f"Enhanced Histogram ({suffix})", counts=stats["processed_counts"], max_value=stats["max_value"])
+    return image_save_path, hist_save_path
+
+def format_peak_rss(peak: int) -> str:
+    return "unavailable on this platform" if peak is None else f"{peak / 2**20:.1f} MB"
+
+def variant_outputs(name: str, variants: list, output_format: image_io.OutputFormat) -> list:
+    """Returns each variant's output image path relative to the output directory, as used in cache keys."""
+    return [output_file_name(name, get_suffix(technique, param), output_format) for technique, param in variants]
+
+def plan_cached(cache, filepath: str, variants: list, force: bool = False, with_histograms: bool = True,
+                output_format: image_io.OutputFormat = None, name: str = None) -> tuple:
+    """Returns (known_hash, fresh_keys, complete) from the cache index using only stat calls.
+
+    complete is True when every variant is already cached for unchanged input content
+    and written under this input's output name.
+    """
+    load_dependencies()
+    if cache is None:
+        return None, frozenset(), False
+    known_hash = cache.known_hash(filepath)
+    if force:
+        return known_hash, frozenset(), False
+    # A changed mtime may still hold the same content; the worker re-hashes and checks these keys
+    output_format = output_format or image_io.OutputFormat()
+    outputs = variant_outputs(name or default_name(filepath), variants, output_format)
+    fresh_keys = frozenset(cache.fresh_keys(known_hash or cache.previous_hash(filepath), variants, with_histograms,
+                                            output_format, outputs))
+    return known_hash, fresh_keys, known_hash is not None and len(fresh_keys) == len(variants)
+
+def pending_variants(content_hash: str, variants: list, fresh_keys: frozenset, with_histograms: bool = True,
+                     output_format: image_io.OutputFormat = None, name: str = "") -> tuple:
+    """Returns (keys, todo): every variant's cache key, and the (variant, key) pairs that still need computing."""
+    load_dependencies()
+    output_format = output_format or image_io.OutputFormat()
+    keys = [result_cache.variant_key(content_hash, technique, param, with_histograms, output_format, output)
+            for (technique, param), output in zip(variants, variant_outputs(name, variants, output_format))]
+    return keys, [(variant, key) for variant, key in zip(variants, keys) if key not in fresh_keys]
+
+def enhance_file_cached(filepath: str, variants: list, output_path: str, memory_limit: int = None,
+                        known_hash: str = None, fresh_keys: frozenset = frozenset(), with_histograms: bool = True,
+                        output_format: image_io.OutputFormat = None, name: str = None) -> dict:
+    """Runs enhance_file for the variants not already cached. Returns what the cache index should record."""
+    load_dependencies()
+    output_format = output_format or image_io.OutputFormat()
+    signature = result_cache.file_signature(filepath)
+    with metrics.stage("hash"):
+        content_hash = known_hash or result_cache.hash_file(filepath)
+    name = name or default_name(filepath)
+    keys, todo = pending_variants(content_hash, variants, fresh_keys, with_histograms, output_format, name)
+    saved = enhance_file(filepath, [variant for variant, _ in todo], output_path, memory_limit, with_histograms,
+                         output_format, name) if todo else []
+    return {
+        "signature": signature,
+        "hash": content_hash,
+        "computed": [(key, list(paths)) for (_, key), paths in zip(todo, saved)],
+        "reused": [key for key in keys if key in fresh_keys],
+    }
+
+def record_cached(cache, filepath: str, result: dict):
+    if cache is None or result is None:
+        return
+    cache.record_input(filepath, result["signature"], result["hash"])
+    for key, paths in result["computed"]:
+        cache.record(key, paths)
+    cache.touch(result["reused"])
+    cache.misses += len(result["computed"])
+    cache.hits += len(result["reused"])
+
+def format_cache_report(cache) -> str:
+    if cache is None:
+        return "disabled"
+    return f"{cache.hits} hit(s), {cache.misses} miss(es), {cache.evicted} evicted"
+
+@contextmanager
+def profiled(profile_dir: str, name: str):
+    """Dumps a cProfile of the block to profile_dir/<name>.prof when profile_dir is set (name as in output_names)."""
+    if not profile_dir:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile_path = os.path.join(profile_dir, f"{name}.prof")
+        os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+        profiler.dump_stats(profile_path)
+
+def file_metrics(filepath: str, elapsed: float, recorder, error: str = None, cached: bool = False) -> dict:
+    return {"file": filepath, "elapsed": elapsed, "error": error, "cached": cached, **recorder.to_dict()}
+
+def _init_batch_worker(quiet: bool = False, log_to_stderr: bool = False):
+    # Spawned workers import this module afresh, without running main()
+    load_dependencies()
+    # Each worker gets its own core, so keep OpenCV and CLAHE from spawning threads of their own
+    cv2.setNumThreads(1)
+    clahe.set_num_threads(1)
+    configure_logging(quiet, sys.stderr if log_to_stderr else sys.stdout)
+
+def _batch_task(filepath: str, variants: list, output_path: str, memory_limit: int = None,
+                known_hash: str = None, fresh_keys: frozenset = frozenset(), profile_dir: str = None,
+                with_histograms: bool = True, output_format: image_io.OutputFormat = None, name: str = None) -> tuple:
+    """Worker entry point. Errors are returned rather than raised so one bad file never stops the batch."""
+    start = time.perf_counter()
+    name = name or default_name(filepath)
+    with metrics.recording() as recorder, profiled(profile_dir, name):
+        try:
+            result = enhance_file_cached(filepath, variants, output_path, memory_limit, known_hash, fresh_keys,
+                                         with_histograms, output_format, name)
+            error = None
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    return filepath, error, elapsed, result, file_metrics(filepath, elapsed, recorder, error)
+
+def run_batch(files: list, variants: list, output_path: str, workers: int = None, max_in_flight: int = None,
+              memory_limit: int = None, cache=None, force: bool = False, profile_dir: str = None,
+              with_histograms: bool = True, output_format: image_io.OutputFormat = None) -> dict:
+    """Processes files across a process pool with a bounded number of in-flight tasks.
+
+    With a ResultCache, files whose outputs are all cached are skipped after a stat call.
+    If a worker process dies (killed for memory, or a native crash), the files it and the
+    other workers had in flight are recorded as failures and a fresh pool takes the rest.
+    The summary's "metrics" holds per-file stage timings and their aggregate.
+    """
+    load_dependencies()
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    output_format = output_format or image_io.OutputFormat()
+    names = output_names(files)
+    failures = []
+    done_count = 0
+    aggregate = metrics.Recorder()
+    per_file = []
+    start = time.perf_counter()
+
+    quiet = not log.isEnabledFor(logging.INFO)
+    log_to_stderr = bool(log.handlers) and getattr(log.handlers[0], "stream", None) is sys.stderr
+    new_pool = lambda: ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                           initargs=(quiet, log_to_stderr))
+
+    def collect(future, filepath: str) -> bool:
+        """Records one finished task. Returns False if its worker pool broke."""
+        nonlocal done_count
+        broken = False
+        try:
+            filepath, error, _, result, stats = future.result()
+        except BrokenProcessPool:
+            broken = True
+            error = "BrokenProcessPool: a worker process died (out of memory or crashed) while this file was in flight"
+            result, stats = None, file_metrics(filepath, 0.0, metrics.Recorder(), error)
+        done_count += 1
+        if error:
+            failures.append((filepath, error))
+        record_cached(cache, filepath, result)
+        aggregate.merge(stats)
+        per_file.append(stats)
+        return not broken
+
+    pool = new_pool()
+    try:
+        pending = {}  # future -> input path
+        file_iter = iter(files)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    filepath = next(file_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                plan_start = time.perf_counter()
+                known_hash, fresh_keys, complete = plan_cached(cache, filepath, variants, force, with_histograms,
+                                                               output_format, names[filepath])
+                aggregate.add("cache_lookup", time.perf_counter() - plan_start)
+                if complete:
+                    cache.hits += len(fresh_keys)
+                    cache.touch(fresh_keys)
+                    done_count += 1
+                    per_file.append(file_metrics(filepath, 0.0, metrics.Recorder(), cached=True))
+                    continue
+                future = pool.submit(_batch_task, filepath, variants, output_path, memory_limit, known_hash, fresh_keys,
+                                     profile_dir, with_histograms, output_format, names[filepath])
+                pending[future] = filepath
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            healthy = all([collect(future, pending.pop(future)) for future in finished])
+            if not healthy:
+                # Every task still in the broken pool fails too; the remaining files get a fresh pool
+                for future in wait(pending)[0]:
+                    collect(future, pending.pop(future))
+                pool.shutdown(wait=True)
+                pool = new_pool()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "total": len(files),
+        "outputs": (done_count - len(failures)) * len(variants),  # Written or already up to date
+        "succeeded": done_count - len(failures),
+        "failures": failures,
+        "elapsed": elapsed,
+        "workers": workers,
+        # Workers have exited once the pool is shut down, so this is the largest worker's peak
+        "peak_rss": tiled.peak_rss_bytes(children=True),
+        "cache": format_cache_report(cache),
+        "metrics": {"aggregate": aggregate.to_dict(), "files": per_file},
+    }
+
+def run_pipeline_batch(files: list, variants: list, output_path: str, readers: int = DEFAULT_READERS,
+                       workers: int = None, writers: int = DEFAULT_WRITERS, queue_size: int = pipeline.DEFAULT_QUEUE_SIZE,
+                       cache=None, force: bool = False, with_histograms: bool = True,
+                       output_format: image_io.OutputFormat = None) -> dict:
+    """Processes files through reader, transform and writer thread stages joined by bounded queues.
+
+    Readers load each file's bytes, hash them for the cache and decode them; transform threads
+    apply the variants; writers encode and save every output. Disk and CPU work on different
+    files at the same time, and several readers keep a high-latency (network) store busy.
+    Returns the same summary as run_batch plus "pipeline": per-stage utilization and the bottleneck.
+    """
+    load_dependencies()
+    output_format = output_format or image_io.OutputFormat()
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        # Parallelism comes from the transform threads; nested thread pools would only contend
+        cv2.setNumThreads(1)
+        clahe.set_num_threads(1)
+    names = output_names(files)
+    aggregate = metrics.Recorder()
+    jobs = []
+    lock = threading.Lock()
+
+    def planned():
+        for filepath in files:
+            plan_start = time.perf_counter()
+            known_hash, fresh_keys, complete = plan_cached(cache, filepath, variants, force, with_histograms,
+                                                           output_format, names[filepath])
+            aggregate.add("cache_lookup", time.perf_counter() - plan_start)
+            job = {"file": filepath, "known_hash": known_hash, "fresh_keys": fresh_keys, "cached": complete,
+                   "error": None, "computed": [], "recorder": metrics.Recorder(), "start": None, "end": None}
+            jobs.append(job)
+            if complete:
+                cache.hits += len(fresh_keys)
+                cache.touch(fresh_keys)
+                continue
+            yield job
+
+    @contextmanager
+    def recorded(job: dict):
+        # Stages of one file run on different threads; each call records on its own and merges
+        with metrics.recording() as recorder:
+            try:
+                yield
+            finally:
+                with lock:
+                    job["recorder"].merge(recorder)
+                    job["end"] = time.perf_counter()
+
+    def read(job: dict):
+        job["start"] = time.perf_counter()
+        with recorded(job):
+            job["signature"] = result_cache.file_signature(job["file"])
+            with metrics.stage("read"):
+                with open(job["file"], "rb") as f:
+                    data = f.read()
+            metrics.count("bytes_read", len(data))
+            with metrics.stage("hash"):
+                job["hash"] = job["known_hash"] or result_cache.hash_bytes(data)
+            job["keys"], job["todo"] = pending_variants(job["hash"], variants, job["fresh_keys"], with_histograms,
+                                                        output_format, names[job["file"]])
+            if not job["todo"]:
+                return
+            with metrics.stage("decode"):
+                image, max_value = image_io.decode_image(data)
+            metrics.count("pixels", image.size)
+            del data
+        yield job, image, max_value
+
+    def transform(item: tuple):
+        job, image, max_value = item
+        with recorded(job):
+            for result in transform_variants(job["file"], image, max_value, [variant for variant, _ in job["todo"]],
+                                             with_histograms):
+                yield (job,) + result
+
+    def write(item: tuple) -> tuple:
+        job, index, suffix, processed_image, counts, lut_max = item
+        with recorded(job):
+            paths = save_variant(processed_image, output_path, names[job["file"]], suffix, counts, lut_max, with_histograms,
+                                 output_format)
+        with lock:
+            job["computed"].append((job["todo"][index][1], list(paths)))
+        return ()
+
+    def on_error(stage: str, item, error: Exception):
+        job = item if isinstance(item, dict) else item[0]
+        with lock:
+            job["error"] = job["error"] or f"{type(error).__name__}: {error}"
+            job["end"] = time.perf_counter()
+
+    stages = [pipeline.Stage("read", read, readers), pipeline.Stage("transform", transform, workers),
+              pipeline.Stage("write", write, writers)]
+    _, report = pipeline.run_pipeline(planned(), stages, queue_size, on_error)
+
+    failures, per_file = [], []
+    for job in jobs:
+        if job["cached"]:
+            per_file.append(file_metrics(job["file"], 0.0, metrics.Recorder(), cached=True))
+            continue
+        elapsed = job["end"] - job["start"]
+        if job["error"]:
+            failures.append((job["file"], job["error"]))
+        else:
+            record_cached(cache, job["file"], {"signature": job["signature"], "hash": job["hash"], "computed": job["computed"],
+                                               "reused": [key for key in job["keys"] if key in job["fresh_keys"]]})
+        stats = file_metrics(job["file"], elapsed, job["recorder"], job["error"])
+        aggregate.merge(stats)
+        per_file.append(stats)
+
+    succeeded = len(jobs) - len(failures)
+    return {
+        "total": len(files),
+        "outputs": succeeded * len(variants),  # Written or already up to date
+        "succeeded": succeeded,
+        "failures": failures,
+        "elapsed": report["elapsed"],
+        "workers": workers,
+        "peak_rss": tiled.peak_rss_bytes(),
+        "cache": format_cache_report(cache),
+        "metrics": {"aggregate": aggregate.to_dict(), "files": per_file},
+        "pipeline": report,
+    }
+
+def print_batch_summary(summary: dict):
+    elapsed = summary["elapsed"]
+    rate = summary["total"] / elapsed if elapsed > 0 else 0.0
+    log.info("\n--- Batch Summary ---")
+    if "pipeline" in summary:
+        log.info("Threads:     %s", ", ".join(f"{s['name']} {s['threads']}" for s in summary["pipeline"]["stages"]))
+    else:
+        log.info("Workers:     %d", summary["workers"])
+    log.info("Images:      %d", summary["total"])
+    log.info("Succeeded:   %d", summary["succeeded"])
+    log.info("Failed:      %d", len(summary["failures"]))
+    log.info("Outputs:     %d", summary["outputs"])
+    log.info("Elapsed:     %.2f s", elapsed)
+    log.info("Throughput:  %.2f images/s", rate)
+    log.info("Peak RSS:    %s (%s)", format_peak_rss(summary["peak_rss"]), "this process" if "pipeline" in summary else "largest worker")
+    log.info("Cache:       %s", summary["cache"])
+    if "pipeline" in summary:
+        log.info("Bottleneck:  %s", summary["pipeline"]["bottleneck"])
+        log.info(pipeline.format_report(summary["pipeline"]))
+    for filepath, error in summary["failures"]:
+        log.error("--> FAILED %s: %s", filepath, error)
+
+def report_metrics(report: dict, fmt: str, output: str = None):
+    """Writes the stage breakdown as JSON or a text table to output, or to stdout (even with --quiet)."""
+    if fmt == "json":
+        text = json.dumps(report, indent=2)
+    else:
+        aggregate = metrics.Recorder()
+        aggregate.merge(report["aggregate"])
+        lines = ["--- Stage Metrics ---", aggregate.format_table()]
+        for stats in report["files"]:
+            if stats["cached"]:
+                lines.append(f"--> {stats['file']}: cached")
+                continue
+            stages = sorted(stats["stages"].items(), key=lambda item: -item[1]["seconds"])
+            breakdown = ", ".join(f"{name} {s['seconds'] * 1000:.1f}" for name, s in stages)
+            lines.append(f"--> {stats['file']}: {stats['elapsed'] * 1000:.1f} ms ({breakdown})")
+        if "pipeline" in report:
+            lines += ["--- Pipeline Stages ---", pipeline.format_report(report["pipeline"])]
+        text = "\n".join(lines)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -59,72 +733,172 @@ def main():
         formatter_class=argparse.RawTextHelpFormatter
     )
     
-    parser.add_argument("filepath", type=str, help="Path to the input image file.")
-    parser.add_argument("-t", "--technique", type=str, required=True, choices=["hist_eq", "gamma"], help="The enhancement technique to apply:\n'hist_eq': Histogram Equalization\n'gamma':   Power-Law (Gamma) Correction")
-    parser.add_argument("-g", "--gamma", type=float, help="The gamma value for the 'gamma' technique. Required if technique is 'gamma'.")
+    parser.add_argument("inputs", type=str, nargs="*", help="Input image files, directories (searched recursively) or glob patterns.")
+    parser.add_argument("-t", "--technique", type=parse_techniques, required=True, help="The enhancement technique(s) to apply, comma-separated:\n'hist_eq': Histogram Equalization\n'gamma':   Power-Law (Gamma) Correction\n'clahe':   Contrast-Limited Adaptive Histogram Equalization\n'window':  Window/Level (VOI LUT)")
+    parser.add_argument("-g", "--gamma", type=parse_gamma_values, help="The gamma value(s) for the 'gamma' technique. Required if technique is 'gamma'.\nAccepts a value (0.7), a list (0.5,0.7,1.5) or an inclusive range (0.3:3.0:0.1).")
+    parser.add_argument("--clip-limit", type=float, default=2.0, help="CLAHE clip limit, relative to the mean tile histogram height; 0 disables clipping. (Default: 2.0)")
+    parser.add_argument("--tile-grid", type=str, default="8x8", help="CLAHE tile grid as COLUMNSxROWS, or one number for a square grid. (Default: 8x8)")
+    parser.add_argument("--window-center", type=float, help="Window/Level center in pixel values. (Default: from the DICOM header, else mid-range)")
+    parser.add_argument("--window-width", type=float, help="Window/Level width in pixel values. (Default: from the DICOM header, else the full range)")
+    parser.add_argument("--voi", choices=VOI_FUNCTIONS, default="linear", help="Window/Level VOI function. (Default: linear)")
     parser.add_argument("-o", "--output_dir", type=str, default=DEFAULT_OUTPUT_DIR, help=f"The directory to save output files. (Default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("-m", "--manifest", type=str, help="A text file listing one input path per line.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes for batch mode. (Default: number of CPU cores)")
+    parser.add_argument("--tiled", action="store_true", help="Process images in strips to bound memory use. .npy and DICOM inputs are read strip by strip;\nother inputs, and tiff or bmp outputs, still need the whole image in memory.")
+    parser.add_argument("--memory-limit", type=int, default=64, help="Memory ceiling in MB for the strips processed by --tiled. (Default: 64)")
+    parser.add_argument("--pipeline", action="store_true", help="Overlap reading, transforming and writing across files with thread stages\njoined by bounded queues, and report the bottleneck stage. -j sets the transform threads.")
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS, help=f"Reader threads for --pipeline; raise it for network storage. (Default: {DEFAULT_READERS})")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS, help=f"Writer threads for --pipeline. (Default: {DEFAULT_WRITERS})")
+    parser.add_argument("--queue-size", type=int, default=pipeline.DEFAULT_QUEUE_SIZE, help=f"Items buffered between --pipeline stages. (Default: {pipeline.DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="png", help="Output image format. tiff (uncompressed), bmp (8-bit only) and npy encode\nmuch faster than png but use more disk. Histogram plots stay PNG. (Default: png)")
+    parser.add_argument("--png-compression", type=int, choices=range(10), metavar="0-9", help="PNG compression level; lower is faster and larger. (Default: OpenCV's)")
+    parser.add_argument("-f", "--force", action="store_true", help="Recompute every output even if the result cache says it is up to date.")
+    parser.add_argument("--cache-limit", type=int, default=result_cache.DEFAULT_CACHE_LIMIT // 2**20, help="Size in MB of outputs tracked by the result cache before old entries are dropped. (Default: 10240)")
+    parser.add_argument("--no-hist", action="store_true", help="Skip the histogram plots; only the enhanced images are written.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only report errors (and the metrics, if requested).")
+    parser.add_argument("--metrics", choices=METRICS_FORMATS, help="Report per-file and aggregate time spent in each stage\n(decode, hash, histogram, transform, encode, histogram_render).")
+    parser.add_argument("--metrics-output", type=str, help="Write the --metrics report to this file. (Default: stdout)")
+    parser.add_argument("--profile", type=str, metavar="DIR", help="Write a cProfile dump per input image to DIR (<image name>.prof).")
 
     args = parser.parse_args()
     
-    if args.technique == 'gamma' and not args.gamma:
+    if 'gamma' in args.technique and not args.gamma:
         parser.error("The --gamma (-g) argument is REQUIRED when using the 'gamma' technique.")
-    print(f"Step 1: Validating input file path...")
-    absolute_filepath = os.path.abspath(args.filepath)
+    if not args.inputs and not args.manifest:
+        parser.error("At least one input path or a --manifest is required.")
+    if args.workers < 1:
+        parser.error("The --workers (-j) value must be at least 1.")
+    if args.memory_limit < 1:
+        parser.error("The --memory-limit value must be at least 1 MB.")
+    if args.readers < 1 or args.writers < 1 or args.queue_size < 1:
+        parser.error("The --readers, --writers and --queue-size values must be at least 1.")
+    if args.pipeline and args.tiled:
+        parser.error("--pipeline and --tiled cannot be combined.")
+    if args.pipeline and args.profile:
+        parser.error("--profile is per worker process and cannot be combined with --pipeline.")
+    if args.tiled and not set(args.technique) <= set(POINT_TECHNIQUES):
+        parser.error("--tiled only supports the point transforms: " + ", ".join(POINT_TECHNIQUES) + ".")
+    if args.clip_limit < 0:
+        parser.error("The --clip-limit value must not be negative.")
+    if args.window_width is not None and args.window_width < 1:
+        parser.error("The --window-width value must be at least 1.")
+    load_dependencies()
+    try:
+        tiles = clahe.parse_tiles(args.tile_grid)
+    except ValueError:
+        parser.error(f"Invalid --tile-grid '{args.tile_grid}' (use e.g. 8 or 8x8).")
+    args.variants = get_variants(args.technique, args.gamma or [], clahe.ClaheParams(args.clip_limit, tiles),
+                                 transforms.WindowParams(args.window_center, args.window_width, args.voi))
+    args.with_histograms = not args.no_hist
+    args.output_format = image_io.OutputFormat(args.format, args.png_compression)
+    args.memory_limit_bytes = args.memory_limit * 2**20 if args.tiled else None
+
+    # A JSON report on stdout must not be interleaved with progress messages
+    json_on_stdout = args.metrics == "json" and not args.metrics_output
+    configure_logging(args.quiet, sys.stderr if json_on_stdout else sys.stdout)
+    if args.profile:
+        args.profile = os.path.abspath(args.profile)
+        os.makedirs(args.profile, exist_ok=True)
+
+    if args.pipeline or args.manifest or len(args.inputs) != 1 or os.path.isdir(args.inputs[0]) or glob.has_magic(args.inputs[0]):
+        run_batch_mode(args)
+        return
+
+    log.info("Step 1: Validating input file path...")
+    absolute_filepath = os.path.abspath(args.inputs[0])
     
     if not os.path.exists(absolute_filepath):
-        print(f"\n--- FATAL ERROR ---")
-        print(f"Input file not found at the specified path.")
-        print(f"Attempted to read: {absolute_filepath}")
-        print(f"Please check the filename for typos and ensure it's in the correct folder.")
+        log.error("\n--- FATAL ERROR ---")
+        log.error("Input file not found at the specified path.")
+        log.error("Attempted to read: %s", absolute_filepath)
+        log.error("Please check the filename for typos and ensure it's in the correct folder.")
         return
 
-    print(f"--> File found: {absolute_filepath}")
+    log.info("--> File found: %s", absolute_filepath)
 
     try:
         # --- Main Logic ---
-        print("\nStep 2: Preparing output directory...")
-        # Get the directory of the script to create the output folder there
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        output_path = os.path.join(script_dir, args.output_dir)
-
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
-            print(f"--> Created output directory: '{output_path}'")
-        else:
-            print(f"--> Output directory already exists: '{output_path}'")
-
-        print("\nStep 3: Processing image...")
-        original_image = cv2.imread(absolute_filepath, cv2.IMREAD_GRAYSCALE)
-        if original_image is None:
-            print(f"--- FATAL ERROR ---")
-            print(f"The file was found, but OpenCV could not read it. It may be corrupted or in an unsupported format.")
-            return
-
-        if args.technique == "hist_eq":
-            processed_image = apply_histogram_equalization(original_image)
-            suffix = "hist_eq"
-        else: # Must be gamma, already validated
-            processed_image = apply_gamma_correction(original_image, args.gamma)
-            suffix = f"gamma_{args.gamma:.2f}"
-        
-        print("\nStep 4: Saving output files...")
-        base_name, _ = os.path.splitext(os.path.basename(absolute_filepath))
-        new_image_filename = f"{base_name}_{suffix}.png"
-        new_hist_filename = f"{base_name}_{suffix}_hist.png"
-        
-        image_save_path = os.path.join(output_path, new_image_filename)
-        hist_save_path = os.path.join(output_path, new_hist_filename)
-
-        cv2.imwrite(image_save_path, processed_image)
-        print(f"--> Saved enhanced image to: {image_save_path}")
-        
-        save_histogram_to_file(processed_image, hist_save_path, f"Enhanced Histogram ({suffix})")
-
-        print("\n--- Enhancement Complete! ---")
+        log.info("\nStep 2: Preparing output directory...")
+        output_path = prepare_output_dir(args.output_dir)
+
+        log.info("\nStep 3: Processing image...")
+        start = time.perf_counter()
+        with metrics.recording() as recorder:
+            with metrics.stage("cache_lookup"):
+                cache = result_cache.ResultCache(output_path, args.cache_limit * 2**20)
+                known_hash, fresh_keys, complete = plan_cached(cache, absolute_filepath, args.variants, args.force, args.with_histograms,
+                                                               args.output_format)
+            try:
+                if complete:
+                    log.info("--> All outputs are up to date (use --force to recompute).")
+                    cache.hits += len(fresh_keys)
+                    cache.touch(fresh_keys)
+                else:
+                    with profiled(args.profile, default_name(absolute_filepath)):
+                        result = enhance_file_cached(absolute_filepath, args.variants, output_path, args.memory_limit_bytes,
+                                                     known_hash, fresh_keys, args.with_histograms, args.output_format)
+                    record_cached(cache, absolute_filepath, result)
+            except ValueError as e:
+                log.error("--- FATAL ERROR ---")
+                log.error("The file was found, but %s", e)
+                return
+            with metrics.stage("cache_save"):
+                cache.save()
+        elapsed = time.perf_counter() - start
+
+        log.info("--> Cache: %s", format_cache_report(cache))
+        log.info("--> Peak RSS: %s", format_peak_rss(tiled.peak_rss_bytes()))
+        if args.metrics:
+            report = {"mode": "single", "elapsed": elapsed, "aggregate": recorder.to_dict(),
+                      "files": [file_metrics(absolute_filepath, elapsed, recorder, cached=complete)]}
+            report_metrics(report, args.metrics, args.metrics_output)
+        log.info("\n--- Enhancement Complete! ---")
 
     except Exception as e:
-        print(f"\n--- An Unexpected Error Occurred ---")
-        print(f"Error details: {e}")
+        log.error("\n--- An Unexpected Error Occurred ---")
+        log.error("Error details: %s", e)
+
+def run_batch_mode(args):
+    log.info("Step 1: Collecting input files...")
+    try:
+        files = collect_input_files(args.inputs, args.manifest)
+    except OSError as e:
+        log.error("\n--- FATAL ERROR ---")
+        log.error("Could not read the manifest: %s", e)
+        return
+    if not files:
+        log.error("\n--- FATAL ERROR ---")
+        log.error("No image files matched the given inputs.")
+        return
+    log.info("--> Found %d image(s)", len(files))
+
+    log.info("\nStep 2: Preparing output directory...")
+    output_path = prepare_output_dir(args.output_dir)
+
+    workers = min(args.workers, len(files))
+    cache = result_cache.ResultCache(output_path, args.cache_limit * 2**20)
+    try:
+        if args.pipeline:
+            log.info("\nStep 3: Processing images through a %d-reader, %d-transform, %d-writer pipeline, %d output(s) per image...",
+                     args.readers, workers, args.writers, len(args.variants))
+            summary = run_pipeline_batch(files, args.variants, output_path, readers=args.readers, workers=workers,
+                                         writers=args.writers, queue_size=args.queue_size, cache=cache, force=args.force,
+                                         with_histograms=args.with_histograms, output_format=args.output_format)
+        else:
+            log.info("\nStep 3: Processing images with %d worker(s), %d output(s) per image...", workers, len(args.variants))
+            summary = run_batch(files, args.variants, output_path, workers=workers, memory_limit=args.memory_limit_bytes,
+                                cache=cache, force=args.force, profile_dir=args.profile,
+                                with_histograms=args.with_histograms, output_format=args.output_format)
+    finally:
+        # Even an interrupted batch keeps the results it finished
+        cache.save()
+    print_batch_summary(summary)
+    if args.metrics:
+        report = {"mode": "pipeline" if args.pipeline else "batch", "elapsed": summary["elapsed"],
+                  "workers": summary["workers"], **summary["metrics"]}
+        if args.pipeline:
+            report["pipeline"] = summary["pipeline"]
+        report_metrics(report, args.metrics, args.metrics_output)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,266 @@
+import os
+import argparse
+import base64
+import glob
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+try:
+    import numpy as np
+    from enhancement import api, clahe, service, transforms
+except ImportError as e:
+    print(f"--> Error: A required library is missing: {e.name}")
+    print("--> Please install the necessary libraries by running this command:")
+    print("pip install opencv-python numpy")
+    sys.exit(1)
+
+# --- Constants ---
+HOST = "127.0.0.1"  # Local use only; the server is never exposed beyond this machine
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 256 * 1024 * 1024
+REQUEST_TIMEOUT = 60.0
+DATASET_DIRS = ("dataset/NORMAL", "dataset/Pneumonia")
+
+log = logging.getLogger("enhance_server")
+
+def parse_request(path: str) -> dict:
+    """Parses '/enhance?technique=gamma&gamma=0.7&histogram=1' into a job. Raises ValueError on bad parameters.
+
+    CLAHE takes clip_limit and tiles ('8' or '8x6'); window takes center, width and voi
+    (linear or sigmoid), and spans the full range when center or width is left out.
+    """
+    params = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+    get = lambda name, default=None: params.get(name, [default])[0]
+    technique = get("technique")
+    if technique not in api.TECHNIQUES:
+        raise ValueError(f"technique must be one of: {', '.join(api.TECHNIQUES)}")
+    param = None
+    if technique == "gamma":
+        try:
+            param = transforms.quantize_gamma(float(get("gamma", "")))
+        except ValueError:
+            raise ValueError(f"gamma must be a finite number of at least {10 ** -transforms.GAMMA_DECIMALS:g}")
+    elif technique == "clahe":
+        tiles = get("tiles")
+        try:
+            param = clahe.ClaheParams(float(get("clip_limit", clahe.DEFAULT_CLIP_LIMIT)),
+                                      clahe.parse_tiles(tiles) if tiles else clahe.DEFAULT_TILES)
+        except ValueError:
+            raise ValueError("clip_limit must be a number and tiles a grid such as 8 or 8x8")
+        if param.clip_limit < 0:
+            raise ValueError("clip_limit must not be negative")
+    elif technique == "window":
+        voi = get("voi", "linear")
+        if voi not in transforms.VOI_FUNCTIONS:
+            raise ValueError(f"voi must be one of: {', '.join(transforms.VOI_FUNCTIONS)}")
+        try:
+            center, width = (None if get(name) is None else float(get(name)) for name in ("center", "width"))
+        except ValueError:
+            raise ValueError("center and width must be numbers")
+        if width is not None and width < 1:
+            raise ValueError("width must be at least 1")
+        param = transforms.WindowParams(center, width, voi)
+    return {"technique": technique, "param": param, "histogram": get("histogram", "0").lower() in ("1", "true", "yes")}
+
+class EnhanceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so a client can reuse its connection
+    timeout = REQUEST_TIMEOUT  # Socket timeout: drops stalled bodies and idle keep-alive connections
+
+    def log_message(self, format, *args):
+        log.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status: int, payload: dict, headers: dict = None):
+        self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif path == "/stats":
+            self.send_json(200, {"latency": self.server.latency.summary(), **self.server.batcher.stats()})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        if urllib.parse.urlsplit(self.path).path != "/enhance":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.send_json(411, {"error": "Content-Length is required"})
+            return
+        if length < 0:
+            # rfile.read(-1) would block until the client disconnects
+            self.send_json(400, {"error": "Content-Length must not be negative"})
+            self.close_connection = True
+            return
+        if length > MAX_BODY_BYTES:
+            self.send_json(413, {"error": f"image larger than {MAX_BODY_BYTES // 2**20} MB"})
+            self.close_connection = True
+            return
+        data = self.rfile.read(length)
+        try:
+            job = parse_request(self.path)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        job["data"] = data
+        try:
+            future = self.server.batcher.submit(job)
+        except queue.Full:
+            self.send_json(503, {"error": "server busy, retry later"}, {"Retry-After": "1"})
+            return
+        try:
+            result = future.result(timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        if "error" in result:
+            self.send_json(result["status"], {"error": result["error"]})
+            return
+
+        headers = {"X-Batch-Size": str(result["batch_size"])}
+        if job["histogram"]:
+            self.send_json(200, {
+                "image": base64.b64encode(result["png"]).decode("ascii"),
+                "histogram": result["counts"].tolist(),
+                "max_value": result["max_value"],
+                "shape": list(result["shape"]),
+            }, headers)
+        else:
+            self.send_body(200, result["png"], "image/png", headers)
+        self.server.latency.record(time.perf_counter() - start)
+
+class EnhanceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, batcher: service.MicroBatcher):
+        super().__init__((HOST, port), EnhanceHandler)
+        self.batcher = batcher
+        self.latency = service.LatencyTracker()
+
+def serve(args):
+    batcher = service.MicroBatcher(args.workers, max_batch=args.max_batch, max_delay=args.max_delay / 1000,
+                                   queue_size=args.queue_size)
+    log.info("--> Starting %d warm worker(s)...", args.workers)
+    batcher.start()
+    server = EnhanceServer(args.port, batcher)
+    log.info("--> Listening on http://%s:%d (POST /enhance?technique=...&gamma=...&histogram=1, GET /stats)", HOST, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        log.info("\n--- Server Stopped ---")
+        log.info(json.dumps({"latency": server.latency.summary(), **batcher.stats()}, indent=2))
+
+def load_images(paths: list) -> list:
+    """Returns the raw bytes of the given images, or of the bundled dataset when none are given."""
+    if not paths:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        paths = sorted(p for d in DATASET_DIRS for p in glob.glob(os.path.join(script_dir, d, "*.jpeg")))
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+def run_load_test(args):
+    """Sends requests from concurrent local clients and reports client-side latency percentiles."""
+    images = load_images(args.images)
+    if not images:
+        log.error("--> No images to send.")
+        return
+    base_url = f"http://{HOST}:{args.port}"
+    query = urllib.parse.urlencode({"technique": args.technique, "gamma": args.gamma, "histogram": int(args.histogram)})
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def send(i):
+        request = urllib.request.Request(f"{base_url}/enhance?{query}", data=images[i % len(images)], method="POST",
+                                         headers={"Content-Type": "application/octet-stream"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    log.info("--> Sending %d request(s) from %d client(s) to %s...", args.requests, args.concurrency, base_url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    log.info("\n--- Load Test Summary ---")
+    log.info("Requests:    %d in %.2f s (%.1f/s)", args.requests, elapsed, args.requests / elapsed)
+    log.info("Statuses:    %s", ", ".join(f"{code}: {n}" for code, n in sorted(statuses.items())))
+    if latencies:
+        p50, p90, p99 = np.percentile(latencies, service.PERCENTILES) * 1000
+        log.info("Client p50:  %.1f ms   p90: %.1f ms   p99: %.1f ms", p50, p90, p99)
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=REQUEST_TIMEOUT) as response:
+        stats = json.load(response)
+    server_latency = stats["latency"]
+    if server_latency.get("window"):
+        log.info("Server p50:  %.1f ms   p90: %.1f ms   p99: %.1f ms", server_latency["p50_ms"], server_latency["p90_ms"], server_latency["p99_ms"])
+    log.info("Batches:     %d (mean size %.2f), rejected %d", stats["batches"], stats["mean_batch_size"], stats["rejected"])
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="A local HTTP server for medical image enhancement, with a load-test client.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port on {HOST} to listen on or connect to. (Default: {DEFAULT_PORT})")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Number of warm worker processes. (Default: number of CPU cores)")
+    parser.add_argument("--max-batch", type=int, default=service.DEFAULT_MAX_BATCH, help=f"Most requests handed to a worker at once. (Default: {service.DEFAULT_MAX_BATCH})")
+    parser.add_argument("--max-delay", type=float, default=service.DEFAULT_MAX_DELAY * 1000, help=f"Longest wait in ms for a batch to fill. (Default: {service.DEFAULT_MAX_DELAY * 1000:g})")
+    parser.add_argument("--queue-size", type=int, default=service.DEFAULT_QUEUE_SIZE, help=f"Queued requests before new ones get 503. (Default: {service.DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request.")
+    load = parser.add_argument_group("load test (client mode)")
+    load.add_argument("--load-test", action="store_true", help="Act as a client and load-test a server already running on --port.")
+    load.add_argument("images", type=str, nargs="*", help="Images to send. (Default: the bundled dataset)")
+    load.add_argument("-n", "--requests", type=int, default=200, help="Total requests to send. (Default: 200)")
+    load.add_argument("-c", "--concurrency", type=int, default=8, help="Concurrent client connections. (Default: 8)")
+    load.add_argument("-t", "--technique", type=str, choices=api.TECHNIQUES, default="gamma", help="Technique to request. (Default: gamma)")
+    load.add_argument("-g", "--gamma", type=float, default=0.7, help="Gamma to request. (Default: 0.7)")
+    load.add_argument("--histogram", action="store_true", help="Also request the histogram counts (JSON response).")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(message)s", level=logging.DEBUG if args.verbose else logging.INFO, stream=sys.stdout)
+    if args.workers < 1 or args.max_batch < 1 or args.queue_size < 1:
+        parser.error("--workers, --max-batch and --queue-size must be at least 1.")
+    if args.load_test:
+        run_load_test(args)
+    else:
+        serve(args)
+
+if __name__ == "__main__":
+    main()
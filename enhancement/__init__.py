@@ -0,0 +1,24 @@
+"""Headless image enhancement core shared by the CLI and the GUI.
+
+``import enhancement`` is cheap: submodules, and the batch API re-exported
+from ``enhancement.api``, are imported on first attribute access, so OpenCV
+and NumPy load only when something actually uses them.
+"""
+import importlib
+
+# Part of every result-cache key; bump it when a change alters output pixels
+__version__ = "1.1.0"
+
+_SUBMODULES = ("api", "background", "clahe", "histogram_render", "histograms", "image_io", "metrics",
+               "pipeline", "pyramid", "result_cache", "service", "tiled", "transforms")
+_API = ("TECHNIQUES", "enhance", "enhance_variants", "histogram", "lut_for", "output_suffix", "read", "write")
+
+__all__ = list(_SUBMODULES + _API)
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name in _API:
+        return getattr(importlib.import_module(".api", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,157 @@
+"""Batch-friendly entry points for code that embeds the enhancement core.
+
+Functions accept a single 2-D grayscale image, an (N, H, W) stack or a list
+of 2-D images, and return results of the same kind. uint8 and uint16 data
+are both supported; ``max_value`` is the top of a high-bit image's range
+(4095 for 12-bit data) and defaults to the full range of the dtype. Nothing
+here imports tkinter, PIL or matplotlib.
+
+"hist_eq", "gamma" and "window" are lookup tables; "clahe" depends on each
+pixel's neighbourhood and goes through ``enhancement.clahe`` instead.
+"""
+import cv2
+import numpy as np
+
+from . import clahe, histograms, image_io, transforms
+
+# --- Constants ---
+TECHNIQUES = ("hist_eq", "gamma", "clahe", "window")
+
+
+def _split(images) -> tuple:
+    """Returns (list of 2-D images, kind) where kind is "image", "stack" or "list"."""
+    if isinstance(images, np.ndarray):
+        if images.ndim == 2:
+            return [images], "image"
+        if images.ndim == 3:
+            return list(images), "stack"
+        raise ValueError(f"Expected a 2-D image or an (N, H, W) stack, got shape {images.shape}")
+    return list(images), "list"
+
+
+def _join(results: list, kind: str, empty: np.ndarray = None):
+    """Returns results in the caller's form. ``empty`` is returned for a stack with no images."""
+    if kind == "image":
+        return results[0]
+    if kind == "stack":
+        return np.stack(results) if results else empty
+    return results
+
+
+def _lut_max(image: np.ndarray, max_value: int = None) -> int:
+    return 255 if image.dtype == np.uint8 else (max_value or int(np.iinfo(image.dtype).max))
+
+
+def _window(window) -> transforms.WindowParams:
+    return transforms.WindowParams(*window) if window is not None else transforms.WindowParams()
+
+
+def lut_for(image: np.ndarray, technique: str, gamma: float = None, max_value: int = None,
+            window=None) -> np.ndarray:
+    """Returns the LUT that applies ``technique`` to ``image``. Only equalization reads the pixels.
+
+    ``window`` is a (center, width[, "linear" | "sigmoid"]) tuple; without one
+    the window spans the full range.
+    """
+    if technique == "hist_eq":
+        return histograms.equalization_lut(histograms.compute_histogram(image), _lut_max(image, max_value))
+    if technique == "gamma":
+        if gamma is None:
+            raise ValueError("A gamma value is required for the 'gamma' technique.")
+        return transforms.gamma_lut(gamma, _lut_max(image, max_value))
+    if technique == "window":
+        lut_max = _lut_max(image, max_value)
+        return transforms.window_lut(*transforms.resolve_window(_window(window), lut_max), max_value=lut_max)
+    if technique == "clahe":
+        raise ValueError("CLAHE is not a point transform and has no single LUT.")
+    raise ValueError(f"Unknown technique '{technique}' (choose from {', '.join(TECHNIQUES)})")
+
+
+def enhance(images, technique: str, gamma: float = None, max_value: int = None, window=None,
+            clip_limit: float = clahe.DEFAULT_CLIP_LIMIT, tiles: tuple = clahe.DEFAULT_TILES):
+    """Applies one technique to an image, a stack or a list of images.
+
+    ``clip_limit`` and ``tiles`` (columns, rows) are the CLAHE parameters, as in ``cv2.createCLAHE``.
+    """
+    items, kind = _split(images)
+    if technique == "clahe":
+        return _join([clahe.apply_clahe(image, clip_limit, tiles, _lut_max(image, max_value)) for image in items], kind,
+                     empty=np.empty_like(images))
+    if technique in ("gamma", "window") and kind == "stack" and items:
+        # One table for the whole stack: a single gather over the contiguous block
+        stack = np.ascontiguousarray(images)
+        lut = lut_for(stack[0], technique, gamma, max_value, window)
+        height, width = stack.shape[1:]
+        return transforms.apply_lut(stack.reshape(-1, width), lut).reshape(-1, height, width)
+    return _join([transforms.apply_lut(image, lut_for(image, technique, gamma, max_value, window))
+                  for image in items], kind, empty=np.empty_like(images))
+
+
+def enhance_variants(image: np.ndarray, variants, max_value: int = None) -> np.ndarray:
+    """Applies several (technique, param) pairs to one image. Returns a (len(variants), H, W) stack.
+
+    ``param`` is the gamma value for "gamma", a (center, width[, function])
+    window for "window", a (clip_limit, (columns, rows)) pair for "clahe" and
+    None for "hist_eq".
+    """
+    counts = None
+    model = None
+    out = np.empty((len(variants),) + image.shape, dtype=image.dtype)
+    for i, (technique, param) in enumerate(variants):
+        if technique == "clahe":
+            # OpenCV does 8-bit and full-range 16-bit images; otherwise tile histograms are counted once per grid
+            model = model or clahe.ClaheModel(image, _lut_max(image, max_value))
+            out[i] = model.apply(*(param or (clahe.DEFAULT_CLIP_LIMIT, clahe.DEFAULT_TILES)))
+            continue
+        if technique == "hist_eq":
+            # Equalization needs the histogram; it is counted once for every hist_eq variant
+            counts = histograms.compute_histogram(image) if counts is None else counts
+            lut = histograms.equalization_lut(counts, _lut_max(image, max_value))
+        elif technique == "window":
+            lut = lut_for(image, technique, max_value=max_value, window=param)
+        else:
+            lut = lut_for(image, technique, param, max_value)
+        # One table at a time, written straight into the output stack
+        transforms.apply_lut(image, lut, out=out[i])
+    return out
+
+
+def histogram(images):
+    """Returns exact counts per image: 256 bins for uint8, 65536 bins for uint16."""
+    items, kind = _split(images)
+    empty = np.empty((0, 256 if images.dtype == np.uint8 else 65536), dtype=np.int64) if kind == "stack" else None
+    return _join([histograms.compute_histogram(image) for image in items], kind, empty=empty)
+
+
+def format_window_value(value) -> str:
+    return "auto" if value is None else f"{value:g}"
+
+
+def output_suffix(technique: str, param) -> str:
+    """Returns the output filename suffix for a technique and its parameter, shared by the CLI and the GUI.
+
+    ``param`` is as in ``enhance_variants``: gamma, a ClaheParams or a WindowParams, or None.
+    """
+    if technique == "hist_eq":
+        return "hist_eq"
+    if technique == "clahe":
+        clip_limit, (columns, rows) = param
+        return f"clahe_{clip_limit:g}_{columns}x{rows}"
+    if technique == "window":
+        window = _window(param)
+        # A center or width left to the DICOM header or full range is written as "auto", as in the cache key
+        given = (window.center, window.width)
+        suffix = "window" if given == (None, None) else "window_" + "_".join(format_window_value(v) for v in given)
+        return suffix if window.function == "linear" else f"{suffix}_{window.function}"
+    return f"gamma_{param:.2f}"
+
+
+def read(path: str, mmap: bool = False) -> tuple:
+    """Reads a grayscale image (PNG, JPEG, TIFF, DICOM, .npy...). Returns (image, max_value)."""
+    return image_io.read_image_with_max(path, mmap=mmap)
+
+
+def write(path: str, image: np.ndarray):
+    """Writes an image with OpenCV; 16-bit data keeps its depth in PNG and TIFF."""
+    if not cv2.imwrite(path, image):
+        raise IOError(f"OpenCV could not write: {path}")
@@ -0,0 +1,67 @@
+"""A single background worker that only ever runs the most recent job.
+
+Jobs are generator functions. Each value a job yields is a stage result
+(for example a quick preview, then the full-resolution frame) and is put on
+``results`` together with the job's generation number. Submitting a new job
+makes every older one stale: a stale job stops at its next ``yield`` and a
+job that was still waiting is dropped without running. The consumer polls
+``results`` from its own thread (the Tk main loop) and ignores anything
+older than ``latest_generation``.
+"""
+import queue
+import threading
+
+
+class LatestOnlyWorker:
+    def __init__(self, name: str = "enhancement-worker"):
+        self.results: queue.Queue = queue.Queue()
+        self._condition = threading.Condition()
+        self._pending = None
+        self._generation = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def latest_generation(self) -> int:
+        return self._generation
+
+    def is_stale(self, generation: int) -> bool:
+        return generation != self._generation
+
+    def submit(self, job, *args) -> int:
+        """Queues ``job(*args)``, replacing any job that has not started yet. Returns its generation."""
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, job, args)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """Makes every queued or running job stale."""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._pending = None
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                generation, job, args = self._pending
+                self._pending = None
+            try:
+                for stage in job(*args):
+                    if self.is_stale(generation):
+                        break
+                    self.results.put((generation, stage, None))
+            except Exception as e:
+                self.results.put((generation, None, e))
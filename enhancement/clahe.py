@@ -0,0 +1,279 @@
+"""Contrast-limited adaptive histogram equalization (CLAHE).
+
+Follows ``cv2.createCLAHE`` step for step: the image is split into a grid of
+tiles (padded with BORDER_REFLECT_101 when the size does not divide evenly),
+each tile's histogram is clipped at ``clip_limit`` times the mean bin height,
+the excess is redistributed, and every pixel is bilinearly interpolated
+between the equalization tables of the four nearest tile centres. 8-bit
+output matches OpenCV pixel for pixel.
+
+Full-resolution output of 8-bit and full-range 16-bit images comes straight
+from ``cv2.createCLAHE``, which is faster and needs no extra buffers. The
+stages below are kept apart for what OpenCV cannot do:
+
+- tile histograms are counted one row of tiles at a time and cached per
+  tile grid by ``ClaheModel``, so changing the clip limit only rebuilds the
+  (tiles x bins) tables;
+- the interpolation, the only per-pixel stage, runs block by block between
+  tile centres, where the four tables are fixed LUTs, with block rows spread
+  over a thread pool;
+- ``ClaheModel.apply_resized`` interpolates a display-sized buffer with the
+  full-resolution tables, which is what the GUI shows while a slider moves.
+
+16-bit images are equalized over [0, max_value] with ``max_value + 1``
+bins, so 12-bit data stays 12-bit; OpenCV always uses 65536 bins, so only
+full-range (max_value 65535) images go to it.
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# --- Constants ---
+DEFAULT_CLIP_LIMIT = 2.0
+DEFAULT_TILES = (8, 8)  # (columns, rows), as in cv2.createCLAHE(tileGridSize=...)
+HISTOGRAM_CACHE_SIZE = 4
+
+ClaheParams = namedtuple("ClaheParams", "clip_limit tiles")
+
+_num_threads = os.cpu_count() or 1
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def set_num_threads(count: int):
+    """Sets how many threads interpolate blocks of tiles (1 runs everything on the calling thread)."""
+    global _num_threads, _pool
+    with _pool_lock:
+        _num_threads = max(1, int(count))
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def _map_parallel(func, items: list):
+    """Runs func over items in the shared thread pool, or inline when limited to one thread."""
+    global _pool
+    if _num_threads == 1 or len(items) == 1:
+        return [func(item) for item in items]
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_num_threads, thread_name_prefix="clahe")
+        pool = _pool
+    return list(pool.map(func, items))
+
+
+def parse_tiles(value: str) -> tuple:
+    """Parses a tile grid: '8' for 8x8 or 'COLUMNSxROWS' such as '8x6'. Raises ValueError."""
+    parts = value.lower().split("x")
+    if len(parts) not in (1, 2):
+        raise ValueError(f"invalid tile grid '{value}'")
+    columns, rows = int(parts[0]), int(parts[-1])
+    if columns < 1 or rows < 1:
+        raise ValueError("tile grid sizes must be at least 1")
+    return columns, rows
+
+
+def _bins_for(image: np.ndarray, max_value: int = None) -> int:
+    return 256 if image.dtype == np.uint8 else (max_value or int(np.iinfo(image.dtype).max)) + 1
+
+
+def _check_tiles(image: np.ndarray, tiles: tuple):
+    columns, rows = tiles
+    if columns > image.shape[1] or rows > image.shape[0]:
+        raise ValueError(f"A {columns}x{rows} tile grid is finer than the {image.shape[1]}x{image.shape[0]} image.")
+
+
+def _padded(image: np.ndarray, tiles: tuple) -> np.ndarray:
+    columns, rows = tiles
+    height, width = image.shape
+    if width % columns == 0 and height % rows == 0:
+        return image
+    # Same padding as OpenCV, including a full extra tile row/column when only one side is uneven
+    return cv2.copyMakeBorder(image, 0, rows - height % rows, 0, columns - width % columns, cv2.BORDER_REFLECT_101)
+
+
+def tile_histograms(image: np.ndarray, tiles: tuple = DEFAULT_TILES, max_value: int = None) -> tuple:
+    """Counts every tile's histogram. Returns (histograms (rows, columns, bins), tile_size (w, h)).
+
+    8-bit tiles are counted with ``cv2.calcHist``; 16-bit images one row of
+    tiles at a time, so the only temporary is an int32 copy of one tile row.
+    """
+    columns, rows = tiles
+    _check_tiles(image, tiles)
+    bins = _bins_for(image, max_value)
+    padded = _padded(image, tiles)
+    tile_h, tile_w = padded.shape[0] // rows, padded.shape[1] // columns
+    counts = np.empty((rows, columns, bins), dtype=np.int64)
+    if image.dtype == np.uint8:
+        for r in range(rows):
+            for c in range(columns):
+                tile = padded[r * tile_h:(r + 1) * tile_h, c * tile_w:(c + 1) * tile_w]
+                counts[r, c] = cv2.calcHist([tile], [0], None, [256], [0, 256]).ravel()
+        return counts, (tile_w, tile_h)
+    # Offset each pixel by (column * bins) so one bincount per tile row separates its tiles
+    offset_type = np.int32 if columns * bins <= np.iinfo(np.int32).max else np.int64
+    tile_offsets = (np.arange(columns, dtype=offset_type) * bins).reshape(1, columns, 1)
+    for r in range(rows):
+        strip = padded[r * tile_h:(r + 1) * tile_h]
+        # Values above max_value cannot occur in valid data; count them in the top bin
+        values = np.minimum(strip, bins - 1).astype(offset_type).reshape(tile_h, columns, tile_w)
+        values += tile_offsets
+        counts[r] = np.bincount(values.ravel(), minlength=columns * bins).reshape(columns, bins)
+    return counts, (tile_w, tile_h)
+
+
+def clahe_luts(histograms: np.ndarray, tile_size: tuple, clip_limit: float = DEFAULT_CLIP_LIMIT,
+               dtype=np.uint8) -> np.ndarray:
+    """Clips, redistributes and integrates tile histograms into per-tile tables (rows, columns, bins)."""
+    bins = histograms.shape[-1]
+    tile_area = tile_size[0] * tile_size[1]
+    hist = histograms.reshape(-1, bins).astype(np.int64)
+    if clip_limit > 0:
+        limit = max(int(clip_limit * tile_area / bins), 1)
+        clipped = np.maximum(hist - limit, 0).sum(axis=1)
+        hist = np.minimum(hist, limit)
+        batch, residual = clipped // bins, clipped % bins
+        hist += batch[:, None]
+        # OpenCV hands out the remainder one count at a time, every (bins // residual)-th bin from 0
+        step = np.maximum(bins // np.maximum(residual, 1), 1)
+        index = np.arange(bins)
+        hist += ((index % step[:, None] == 0) & (index // step[:, None] < residual[:, None])).astype(np.int64)
+    scale = np.float32(bins - 1) / np.float32(tile_area)
+    luts = np.rint(np.cumsum(hist, axis=1).astype(np.float32) * scale)
+    return np.clip(luts, 0, bins - 1).astype(dtype).reshape(histograms.shape)
+
+
+def _axis(count: int, tile: int, scale: float = 1.0) -> tuple:
+    """Returns (tile to the left/above, weight of the next tile) for each output position along one axis.
+
+    The tile index is not yet clamped to the grid: -1 and the last index mark
+    the borders, where both neighbours are the same edge tile.
+    """
+    positions = np.arange(count, dtype=np.float32)
+    if scale != 1.0:
+        # Centre of each output pixel in full-resolution coordinates
+        positions = ((positions + np.float32(0.5)) * np.float32(scale) - np.float32(0.5)).astype(np.float32)
+    f = positions * np.float32(1.0 / tile) - np.float32(0.5)
+    first = np.floor(f).astype(np.int64)
+    return first, (f - first).astype(np.float32)
+
+
+def _runs(first: np.ndarray) -> list:
+    """Splits an axis into (start, stop) runs of positions that share the same pair of tiles."""
+    edges = np.flatnonzero(np.diff(first)) + 1
+    return list(zip(np.concatenate(([0], edges)), np.concatenate((edges, [first.size]))))
+
+
+def interpolate(image: np.ndarray, luts: np.ndarray, tile_size: tuple, full_shape: tuple = None) -> np.ndarray:
+    """Maps each pixel through the tables of its four nearest tiles, bilinearly weighted.
+
+    The image is cut into blocks between neighbouring tile centres; inside a
+    block the four tables are fixed, so each is a plain LUT pass, and block
+    rows run in parallel. ``full_shape`` is the (height, width) the tables were
+    built for; pass it when ``image`` is a resized copy so positions map back.
+    """
+    rows, columns, bins = luts.shape
+    height, width = image.shape
+    full_h, full_w = full_shape or image.shape
+    x_first, xa = _axis(width, tile_size[0], full_w / width)
+    y_first, ya = _axis(height, tile_size[1], full_h / height)
+    xa1, ya1 = np.float32(1) - xa, np.float32(1) - ya
+    x_runs = _runs(x_first)
+    if image.dtype == np.uint8:
+        lookup = cv2.LUT
+    else:
+        # Values above max_value cannot occur in valid data; treat them as max_value
+        image = np.minimum(image, bins - 1)
+        lookup = lambda block, lut: np.take(lut, block)
+    out = np.empty(image.shape, dtype=luts.dtype)
+
+    def block_row(y_run):
+        y0, y1 = y_run
+        ty = y_first[y0]
+        upper_luts, lower_luts = luts[max(ty, 0)], luts[min(ty + 1, rows - 1)]
+        wy, wy1 = ya[y0:y1, None], ya1[y0:y1, None]
+        for x0, x1 in x_runs:
+            tx = x_first[x0]
+            left, right = max(tx, 0), min(tx + 1, columns - 1)
+            block = image[y0:y1, x0:x1]
+            wx, wx1 = xa[x0:x1], xa1[x0:x1]
+            # Same operation order and float32 precision as OpenCV, so 8-bit results agree
+            upper = lookup(block, upper_luts[left]) * wx1 + lookup(block, upper_luts[right]) * wx
+            lower = lookup(block, lower_luts[left]) * wx1 + lookup(block, lower_luts[right]) * wx
+            out[y0:y1, x0:x1] = np.clip(np.rint(upper * wy1 + lower * wy), 0, bins - 1)
+
+    _map_parallel(block_row, _runs(y_first))
+    return out
+
+
+class ClaheModel:
+    """CLAHE for one image, with tile histograms cached per tile grid and tables per clip limit."""
+
+    def __init__(self, image: np.ndarray, max_value: int = None, cache_size: int = HISTOGRAM_CACHE_SIZE):
+        self.image = image
+        self.max_value = 255 if image.dtype == np.uint8 else (max_value or int(np.iinfo(image.dtype).max))
+        self._cache_size = cache_size
+        self._histograms = OrderedDict()  # tiles -> (histograms, tile_size)
+        self._luts = OrderedDict()        # (clip_limit, tiles) -> tables
+        # The GUI's worker thread and Tk thread both use the model
+        self._lock = threading.Lock()
+
+    def _cached(self, cache: OrderedDict, key, build):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = build()
+        with self._lock:
+            cache[key] = value
+            while len(cache) > self._cache_size:
+                cache.popitem(last=False)
+        return value
+
+    def tile_histograms(self, tiles: tuple = DEFAULT_TILES) -> tuple:
+        tiles = (int(tiles[0]), int(tiles[1]))
+        return self._cached(self._histograms, tiles, lambda: tile_histograms(self.image, tiles, self.max_value))
+
+    def luts(self, clip_limit: float = DEFAULT_CLIP_LIMIT, tiles: tuple = DEFAULT_TILES) -> tuple:
+        """Returns (tables, tile_size). Only the histogram pass touches the pixels, and it is cached."""
+        histograms, tile_size = self.tile_histograms(tiles)
+        key = (round(float(clip_limit), 4), tuple(tiles))
+        luts = self._cached(self._luts, key, lambda: clahe_luts(histograms, tile_size, clip_limit, self.image.dtype))
+        return luts, tile_size
+
+    def apply(self, clip_limit: float = DEFAULT_CLIP_LIMIT, tiles: tuple = DEFAULT_TILES) -> np.ndarray:
+        """Full-resolution CLAHE. Where OpenCV computes the same result, it does the work."""
+        if _matches_opencv(self.image, self.max_value):
+            return _opencv_clahe(self.image, clip_limit, tiles)
+        luts, tile_size = self.luts(clip_limit, tiles)
+        return interpolate(self.image, luts, tile_size)
+
+    def apply_resized(self, resized: np.ndarray, clip_limit: float = DEFAULT_CLIP_LIMIT,
+                      tiles: tuple = DEFAULT_TILES) -> np.ndarray:
+        """Applies the full-resolution tables to a resized copy of the image (a display preview)."""
+        luts, tile_size = self.luts(clip_limit, tiles)
+        return interpolate(resized, luts, tile_size, full_shape=self.image.shape)
+
+
+def _matches_opencv(image: np.ndarray, max_value: int) -> bool:
+    """True if cv2.createCLAHE uses the same bins: 8-bit, or 16-bit over the full [0, 65535] range."""
+    return image.dtype == np.uint8 or (image.dtype == np.uint16 and max_value == 65535)
+
+
+def _opencv_clahe(image: np.ndarray, clip_limit: float, tiles: tuple) -> np.ndarray:
+    tiles = (int(tiles[0]), int(tiles[1]))
+    _check_tiles(image, tiles)
+    return cv2.createCLAHE(clipLimit=float(clip_limit), tileGridSize=tiles).apply(image)
+
+
+def apply_clahe(image: np.ndarray, clip_limit: float = DEFAULT_CLIP_LIMIT, tiles: tuple = DEFAULT_TILES,
+                max_value: int = None) -> np.ndarray:
+    """One-shot CLAHE of a grayscale uint8 or uint16 image, with cv2.createCLAHE where it gives the same result."""
+    max_value = 255 if image.dtype == np.uint8 else (max_value or int(np.iinfo(image.dtype).max))
+    if _matches_opencv(image, max_value):
+        return _opencv_clahe(image, clip_limit, tiles)
+    return ClaheModel(image, max_value).apply(clip_limit, tiles)
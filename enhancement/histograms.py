@@ -0,0 +1,96 @@
+"""Exact histograms for uint8 (256 bins) and uint16 (65536 bins) images.
+
+Gamma, histogram equalization and window/level are point transforms, so the histogram of a
+processed image is the source histogram pushed through the same LUT. The
+source histogram is counted once per image; every processed histogram after
+that costs one operation per bin instead of a pass over the pixels.
+"""
+import cv2
+import numpy as np
+
+from . import transforms
+
+
+def compute_histogram(image: np.ndarray) -> np.ndarray:
+    """Returns exact counts as int64: 256 bins for uint8 images, 65536 bins for uint16 images."""
+    if image.dtype == np.uint8:
+        return cv2.calcHist([image], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+    return np.bincount(image.ravel(), minlength=65536).astype(np.int64)
+
+
+def remap_histogram(counts: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Returns the histogram of ``lut[image]`` given the histogram of ``image``."""
+    bins = 256 if lut.dtype == np.uint8 else 65536
+    return np.bincount(lut, weights=counts, minlength=bins).astype(np.int64)
+
+
+def equalization_lut(counts: np.ndarray, max_value: int = 255) -> np.ndarray:
+    """Builds the equalization LUT for an image with these counts.
+
+    For 256 bins this mirrors OpenCV's arithmetic (float32 scale,
+    round-half-to-even) so that ``cv2.LUT(image, equalization_lut(...))`` is
+    bit-identical to ``cv2.equalizeHist(image)``. For 65536 bins the same
+    CDF mapping is done in float64 onto [0, max_value] as a uint16 table.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    high_bit = counts.size > 256
+    dtype, float_type = (np.uint16, np.float64) if high_bit else (np.uint8, np.float32)
+    top = max_value if high_bit else 255
+    lut = np.zeros(counts.size, dtype=dtype)
+    nonzero = np.flatnonzero(counts)
+    if nonzero.size == 0:
+        return lut
+    first = nonzero[0]
+    total = counts.sum()
+    if counts[first] == total:
+        # Single-valued image: OpenCV fills the output with that value
+        lut[:] = first
+        return lut
+    scale = float_type(top) / float_type(total - counts[first])
+    cumulative = np.cumsum(counts[first + 1:]).astype(float_type)
+    lut[first + 1:] = np.clip(np.rint(cumulative * scale), 0, top).astype(dtype)
+    return lut
+
+
+def display_counts(counts: np.ndarray, max_value: int = 255, bins: int = 256) -> np.ndarray:
+    """Folds counts over [0, max_value] into ``bins`` equal-width bins for plotting."""
+    counts = np.asarray(counts)[:max_value + 1]
+    if counts.size <= bins:
+        return counts
+    edges = (np.arange(bins) * counts.size) // bins
+    return np.add.reduceat(counts, edges)
+
+
+class HistogramService:
+    """Holds the source histogram of one image and derives processed histograms from LUTs."""
+
+    def __init__(self, image: np.ndarray, max_value: int = None):
+        self.source_counts = compute_histogram(image)
+        self.max_value = max_value or int(np.iinfo(image.dtype).max)
+        self._equalization_lut = None
+
+    def equalization_lut(self) -> np.ndarray:
+        if self._equalization_lut is None:
+            self._equalization_lut = equalization_lut(self.source_counts, self.max_value)
+        return self._equalization_lut
+
+    def lut_for(self, technique: str, param=None) -> np.ndarray:
+        """Returns the LUT for a technique, or None for the identity ("None").
+
+        ``param`` is the gamma value for "gamma" and a WindowParams for "window"
+        (a missing center or width means the full range).
+        """
+        lut_max = self.max_value if self.source_counts.size > 256 else 255
+        if technique == "hist_eq":
+            return self.equalization_lut()
+        if technique == "gamma":
+            return transforms.gamma_lut(param, lut_max)
+        if technique == "window":
+            return transforms.window_lut(*transforms.resolve_window(param, lut_max), max_value=lut_max)
+        return None
+
+    def processed_counts(self, lut: np.ndarray = None) -> np.ndarray:
+        """Returns exact counts after applying ``lut`` (the source counts if ``lut`` is None)."""
+        if lut is None:
+            return self.source_counts
+        return remap_histogram(self.source_counts, lut)
@@ -0,0 +1,419 @@
+"""Image readers for 8-bit, 16-bit and DICOM inputs.
+
+Everything is returned as a single-channel ``uint8`` or ``uint16`` array at
+its native bit depth. PNG/TIFF/JPEG go through OpenCV with
+``IMREAD_ANYDEPTH``; uncompressed DICOM (implicit or explicit VR little
+endian) is parsed here without third-party packages, and its pixel data can
+be memory-mapped straight from the file. ``decode_image`` does the same
+for bytes already in memory. ``read_metadata`` only parses headers and never
+touches pixel data. ``encode_image`` and ``write_image`` produce PNG (with
+an optional compression level) or the faster uncompressed TIFF, BMP and
+``.npy`` outputs; ``PngStreamWriter`` writes a PNG strip by strip.
+"""
+import io
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# --- Constants ---
+DICOM_EXTENSIONS = (".dcm", ".dicom")
+OUTPUT_FORMATS = ("png", "tiff", "bmp", "npy")
+IMPLICIT_VR_LE = "1.2.840.10008.1.2"
+EXPLICIT_VR_LE = "1.2.840.10008.1.2.1"
+SUPPORTED_TRANSFER_SYNTAXES = (IMPLICIT_VR_LE, EXPLICIT_VR_LE)
+
+PIXEL_DATA_TAG = (0x7FE0, 0x0010)
+ITEM_TAG = (0xFFFE, 0xE000)
+ITEM_DELIMITER_TAG = (0xFFFE, 0xE00D)
+SEQUENCE_DELIMITER_TAG = (0xFFFE, 0xE0DD)
+UNDEFINED_LENGTH = 0xFFFFFFFF
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# png_compression None keeps OpenCV's default level
+OutputFormat = namedtuple("OutputFormat", "extension png_compression", defaults=("png", None))
+
+# Explicit VRs whose length field is 4 bytes preceded by 2 reserved bytes
+_LONG_VRS = {b"OB", b"OD", b"OF", b"OL", b"OV", b"OW", b"SQ", b"SV", b"UC", b"UN", b"UR", b"UT", b"UV"}
+
+# Tags we decode, with the VR to use when the transfer syntax is implicit
+_KNOWN_TAGS = {
+    (0x0002, 0x0010): ("transfer_syntax", "UI"),
+    (0x0008, 0x0060): ("modality", "CS"),
+    (0x0028, 0x0002): ("samples_per_pixel", "US"),
+    (0x0028, 0x0004): ("photometric", "CS"),
+    (0x0028, 0x0008): ("frames", "IS"),
+    (0x0028, 0x0010): ("rows", "US"),
+    (0x0028, 0x0011): ("columns", "US"),
+    (0x0028, 0x0100): ("bits_allocated", "US"),
+    (0x0028, 0x0101): ("bits_stored", "US"),
+    (0x0028, 0x0103): ("pixel_representation", "US"),
+    (0x0028, 0x1050): ("window_center", "DS"),
+    (0x0028, 0x1051): ("window_width", "DS"),
+    (0x0028, 0x1052): ("rescale_intercept", "DS"),
+    (0x0028, 0x1053): ("rescale_slope", "DS"),
+}
+
+
+def is_dicom(path: str) -> bool:
+    if path.lower().endswith(DICOM_EXTENSIONS):
+        return True
+    try:
+        with open(path, "rb") as f:
+            f.seek(128)
+            return f.read(4) == b"DICM"
+    except OSError:
+        return False
+
+
+def _decode_value(vr: str, raw: bytes):
+    if vr == "US":
+        values = struct.unpack(f"<{len(raw) // 2}H", raw)
+        return values[0] if len(values) == 1 else list(values)
+    text = raw.decode("ascii", errors="replace").strip("\x00 ")
+    if vr == "IS":
+        return int(text.split("\\")[0]) if text else None
+    if vr == "DS":
+        parts = [float(p) for p in text.split("\\") if p.strip()]
+        return parts[0] if len(parts) == 1 else (parts or None)
+    return text
+
+
+class _DicomParser:
+    """Walks DICOM data elements up to the pixel data without reading it."""
+
+    def __init__(self, f, explicit: bool):
+        self.f = f
+        self.explicit = explicit
+
+    def read_header(self, explicit: bool):
+        raw = self.f.read(8)
+        if len(raw) < 8:
+            return None
+        group, element = struct.unpack("<HH", raw[:4])
+        tag = (group, element)
+        if group == 0xFFFE:
+            # Item and delimiter tags never carry a VR
+            return tag, None, struct.unpack("<I", raw[4:])[0]
+        if explicit:
+            vr = raw[4:6]
+            if vr in _LONG_VRS:
+                length = struct.unpack("<I", self.f.read(4))[0]
+            else:
+                length = struct.unpack("<H", raw[6:])[0]
+            return tag, vr.decode("ascii", errors="replace"), length
+        return tag, None, struct.unpack("<I", raw[4:])[0]
+
+    def skip_undefined(self, explicit: bool):
+        """Skips an undefined-length sequence or item up to its delimiter."""
+        while True:
+            header = self.read_header(explicit)
+            if header is None:
+                raise ValueError("Truncated DICOM sequence.")
+            tag, vr, length = header
+            if tag in (SEQUENCE_DELIMITER_TAG, ITEM_DELIMITER_TAG):
+                return
+            if length == UNDEFINED_LENGTH:
+                self.skip_undefined(explicit)
+            elif tag != ITEM_TAG or length:
+                self.f.seek(length, os.SEEK_CUR)
+
+    def parse(self, meta: dict, explicit: bool, stop_group: int = None) -> dict:
+        while True:
+            start = self.f.tell()
+            header = self.read_header(explicit)
+            if header is None:
+                return meta
+            tag, vr, length = header
+            if stop_group is not None and tag[0] != stop_group:
+                self.f.seek(start)
+                return meta
+            if tag == PIXEL_DATA_TAG:
+                if length == UNDEFINED_LENGTH:
+                    raise ValueError("Encapsulated (compressed) DICOM pixel data is not supported.")
+                meta["pixel_offset"], meta["pixel_length"] = self.f.tell(), length
+                return meta
+            if length == UNDEFINED_LENGTH:
+                self.skip_undefined(explicit)
+            elif tag in _KNOWN_TAGS:
+                name, implicit_vr = _KNOWN_TAGS[tag]
+                meta[name] = _decode_value(vr or implicit_vr, self.f.read(length))
+            else:
+                self.f.seek(length, os.SEEK_CUR)
+
+
+def read_dicom_metadata(path: str) -> dict:
+    """Parses a DICOM header and locates the pixel data without reading it."""
+    with open(path, "rb") as f:
+        return _parse_dicom_header(f)
+
+
+def _parse_dicom_header(f) -> dict:
+    f.seek(128)
+    if f.read(4) != b"DICM":
+        raise ValueError("Not a DICOM file (missing DICM preamble).")
+    parser = _DicomParser(f, explicit=True)
+    meta = parser.parse({}, explicit=True, stop_group=0x0002)
+    transfer_syntax = meta.get("transfer_syntax", IMPLICIT_VR_LE)
+    if transfer_syntax not in SUPPORTED_TRANSFER_SYNTAXES:
+        raise ValueError(f"Unsupported DICOM transfer syntax {transfer_syntax}; only uncompressed little endian is supported.")
+    parser.parse(meta, explicit=transfer_syntax == EXPLICIT_VR_LE)
+
+    if "pixel_offset" not in meta:
+        raise ValueError("DICOM file has no pixel data.")
+    if meta.get("samples_per_pixel", 1) != 1:
+        raise ValueError("Only single-channel (grayscale) DICOM images are supported.")
+    meta.setdefault("bits_allocated", 16)
+    meta.setdefault("bits_stored", meta["bits_allocated"])
+    meta.setdefault("pixel_representation", 0)
+    meta.setdefault("photometric", "MONOCHROME2")
+    meta.setdefault("frames", 1)
+    if meta["bits_allocated"] not in (8, 16):
+        raise ValueError(f"Unsupported DICOM BitsAllocated={meta['bits_allocated']}.")
+    meta["format"] = "DICOM"
+    meta["shape"] = (meta["rows"], meta["columns"])
+    meta["dtype"] = "uint8" if meta["bits_allocated"] == 8 else "uint16"
+    meta["max_value"] = (1 << meta["bits_stored"]) - 1
+    return meta
+
+
+def read_metadata(path: str) -> dict:
+    """Returns shape, dtype and bit depth from the file header only."""
+    if is_dicom(path):
+        return read_dicom_metadata(path)
+    if path.lower().endswith(".npy"):
+        array = np.load(path, mmap_mode="r")
+        return {"format": "NPY", "shape": array.shape, "dtype": str(array.dtype),
+                "max_value": np.iinfo(array.dtype).max if array.dtype.kind == "u" else None}
+    from PIL import Image  # Only imported when needed; Image.open reads just the header
+
+    with Image.open(path) as image:
+        high_bit = image.mode.startswith("I")
+        return {"format": image.format, "shape": (image.height, image.width),
+                "dtype": "uint16" if high_bit else "uint8", "max_value": 65535 if high_bit else 255}
+
+
+def read_dicom(path: str, mmap: bool = False, meta: dict = None) -> np.ndarray:
+    """Reads the first frame of an uncompressed grayscale DICOM file.
+
+    Unsigned MONOCHROME2 data is returned as stored, memory-mapped when
+    ``mmap`` is set. Signed data is shifted into the unsigned range and
+    MONOCHROME1 is inverted so that bright always means dense; both need a
+    copy in memory.
+    """
+    meta = meta or read_dicom_metadata(path)
+    rows, columns = meta["shape"]
+    stored_dtype = _stored_dtype(meta)
+    if mmap:
+        pixels = np.memmap(path, dtype=stored_dtype, mode="r", offset=meta["pixel_offset"], shape=(rows, columns))
+    else:
+        with open(path, "rb") as f:
+            f.seek(meta["pixel_offset"])
+            pixels = np.fromfile(f, dtype=stored_dtype, count=rows * columns).reshape(rows, columns)
+    return _normalize_dicom_pixels(pixels, meta)
+
+
+def read_dicom_rows(f, meta: dict, start: int, stop: int) -> np.ndarray:
+    """Reads rows [start, stop) of the first frame from an open DICOM file, normalized like read_dicom."""
+    columns = meta["shape"][1]
+    stored_dtype = _stored_dtype(meta)
+    f.seek(meta["pixel_offset"] + start * columns * stored_dtype.itemsize)
+    pixels = np.fromfile(f, dtype=stored_dtype, count=(stop - start) * columns).reshape(-1, columns)
+    return _normalize_dicom_pixels(pixels, meta)
+
+
+def _stored_dtype(meta: dict) -> np.dtype:
+    stored_dtype = np.dtype("<u2" if meta["bits_allocated"] == 16 else "u1")
+    if meta["pixel_representation"]:
+        stored_dtype = np.dtype("<i2" if meta["bits_allocated"] == 16 else "i1")
+    rows, columns = meta["shape"]
+    if meta["pixel_length"] < rows * columns * stored_dtype.itemsize:
+        raise ValueError("DICOM pixel data is shorter than Rows x Columns.")
+    return stored_dtype
+
+
+def _normalize_dicom_pixels(pixels: np.ndarray, meta: dict) -> np.ndarray:
+    stored_dtype = pixels.dtype
+    out_dtype = np.uint8 if meta["bits_allocated"] == 8 else np.uint16
+    max_value = meta["max_value"]
+    if meta["pixel_representation"]:
+        offset = 1 << (meta["bits_stored"] - 1)
+        pixels = (pixels.astype(np.int32) + offset).clip(0, max_value).astype(out_dtype)
+    elif stored_dtype.byteorder == ">" or stored_dtype != np.dtype(out_dtype):
+        pixels = pixels.astype(out_dtype)
+    if meta["photometric"] == "MONOCHROME1":
+        pixels = (max_value - np.minimum(pixels, max_value)).astype(out_dtype)
+    return pixels
+
+
+def header_window(path: str) -> tuple:
+    """Returns the first VOI window (center, width) stored in a DICOM header, or None.
+
+    The window is converted from modality units to the pixel values
+    ``read_image`` returns: rescale undone, signed data shifted and
+    MONOCHROME1 inverted the same way as the pixels.
+    """
+    if not is_dicom(path):
+        return None
+    meta = read_dicom_metadata(path)
+    center, width = meta.get("window_center"), meta.get("window_width")
+    if center is None or width is None:
+        return None
+    center = center[0] if isinstance(center, list) else center
+    width = width[0] if isinstance(width, list) else width
+    slope = meta.get("rescale_slope") or 1.0
+    center = (center - meta.get("rescale_intercept", 0.0)) / slope
+    width = width / abs(slope)
+    if meta["pixel_representation"]:
+        center += 1 << (meta["bits_stored"] - 1)
+    if meta["photometric"] == "MONOCHROME1":
+        center = meta["max_value"] - center
+    return center, width
+
+
+def read_image(path: str, mmap: bool = False) -> np.ndarray:
+    """Reads a grayscale image as uint8 or uint16 at its native bit depth."""
+    if is_dicom(path):
+        return read_dicom(path, mmap=mmap)
+    if path.lower().endswith(".npy"):
+        image = np.load(path, mmap_mode="r" if mmap else None)
+        if image.ndim != 2 or image.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"Expected a 2-D uint8 or uint16 array, got {image.ndim}-D {image.dtype}.")
+        return image
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE | cv2.IMREAD_ANYDEPTH)
+    if image is None:
+        raise ValueError("OpenCV could not read the file. It may be corrupted or in an unsupported format.")
+    if image.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"Unsupported pixel type {image.dtype}.")
+    return image
+
+
+def read_image_with_max(path: str, mmap: bool = False) -> tuple:
+    """Returns (image, max_value). DICOM uses BitsStored; other files use the full range of their dtype."""
+    if is_dicom(path):
+        meta = read_dicom_metadata(path)
+        return read_dicom(path, mmap=mmap, meta=meta), meta["max_value"]
+    image = read_image(path, mmap=mmap)
+    return image, full_scale(image)
+
+
+def decode_image(data: bytes) -> tuple:
+    """Decodes an image held in memory (PNG, JPEG, TIFF, .npy or uncompressed DICOM). Returns (image, max_value)."""
+    if data[:6] == b"\x93NUMPY":
+        image = np.load(io.BytesIO(data))
+        if image.ndim != 2 or image.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"Expected a 2-D uint8 or uint16 array, got {image.ndim}-D {image.dtype}.")
+        return image, full_scale(image)
+    if data[128:132] == b"DICM":
+        meta = _parse_dicom_header(io.BytesIO(data))
+        rows, columns = meta["shape"]
+        pixels = np.frombuffer(data, dtype=_stored_dtype(meta), count=rows * columns,
+                               offset=meta["pixel_offset"]).reshape(rows, columns)
+        return _normalize_dicom_pixels(pixels, meta), meta["max_value"]
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE | cv2.IMREAD_ANYDEPTH)
+    if image is None:
+        raise ValueError("OpenCV could not decode the image. It may be corrupted or in an unsupported format.")
+    if image.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"Unsupported pixel type {image.dtype}.")
+    return image, full_scale(image)
+
+
+def full_scale(image: np.ndarray) -> int:
+    return int(np.iinfo(image.dtype).max)
+
+
+def to_8bit(image: np.ndarray, max_value: int = None) -> np.ndarray:
+    """Scales a high-bit-depth image to uint8 for display. uint8 input is returned unchanged."""
+    if image.dtype == np.uint8:
+        return image
+    max_value = max_value or full_scale(image)
+    return cv2.convertScaleAbs(image, alpha=255.0 / max_value)
+
+
+def imwrite_params(output_format: OutputFormat = OutputFormat()) -> list:
+    """Returns the OpenCV encoder flags for an output format."""
+    if output_format.extension == "png" and output_format.png_compression is not None:
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(output_format.png_compression)]
+    if output_format.extension == "tiff":
+        return [cv2.IMWRITE_TIFF_COMPRESSION, 1]  # Uncompressed
+    return []
+
+
+def encode_image(image: np.ndarray, output_format: OutputFormat = OutputFormat()):
+    """Encodes an image in memory. Returns a buffer (bytes or a uint8 array) ready to be written.
+
+    TIFF is written uncompressed, which is much faster to encode than PNG at
+    the cost of larger files; BMP only holds 8-bit data.
+    """
+    extension = output_format.extension
+    if extension == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, image)
+        return buffer.getvalue()
+    if extension == "bmp" and image.dtype != np.uint8:
+        raise ValueError("BMP only holds 8-bit images; use png or tiff for high-bit data.")
+    ok, encoded = cv2.imencode(f".{extension}", image, imwrite_params(output_format))
+    if not ok:
+        raise IOError(f"OpenCV could not encode the image as {extension.upper()}.")
+    return encoded
+
+
+class PngStreamWriter:
+    """Writes a grayscale PNG a strip of rows at a time, holding only the current strip.
+
+    OpenCV can only encode a whole image, so the strip-wise path uses this
+    instead. Rows use the PNG "Up" filter, which suits smooth radiographs;
+    files are a little larger than OpenCV's adaptive filtering and decode to
+    the same pixels.
+    """
+
+    def __init__(self, path: str, shape: tuple, dtype, compression: int = None):
+        self.height, self.width = shape
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"PNG output needs uint8 or uint16 data, got {self.dtype}.")
+        self.rows_written = 0
+        self._previous = np.zeros(self.width * self.dtype.itemsize, dtype=np.uint8)
+        self._compressor = zlib.compressobj(-1 if compression is None else int(compression))
+        self._file = open(path, "wb")
+        self.bytes_written = self._file.write(PNG_SIGNATURE)
+        # Grayscale (color type 0), no interlacing
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8 * self.dtype.itemsize, 0, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        crc = zlib.crc32(data, zlib.crc32(kind))
+        self.bytes_written += self._file.write(struct.pack(">I", len(data)) + kind)
+        self.bytes_written += self._file.write(data)
+        self.bytes_written += self._file.write(struct.pack(">I", crc))
+
+    def write(self, strip: np.ndarray):
+        """Appends the next rows. PNG stores 16-bit samples big-endian."""
+        raw = np.ascontiguousarray(strip, dtype=self.dtype.newbyteorder(">")).view(np.uint8).reshape(len(strip), -1)
+        filtered = np.empty((len(raw), raw.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2  # Up: each byte minus the byte above it
+        np.subtract(raw[0], self._previous, out=filtered[0, 1:])
+        np.subtract(raw[1:], raw[:-1], out=filtered[1:, 1:])
+        self._previous = raw[-1].copy()
+        self.rows_written += len(raw)
+        compressed = self._compressor.compress(filtered)
+        if compressed:
+            self._chunk(b"IDAT", compressed)
+
+    def close(self):
+        """Finishes the file. Closed before every row was written (after an error), it is left truncated."""
+        try:
+            if self.rows_written == self.height:
+                self._chunk(b"IDAT", self._compressor.flush())
+                self._chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+
+
+def write_bytes(path: str, data) -> int:
+    """Writes an encoded buffer to path. Returns the number of bytes written."""
+    with open(path, "wb") as f:
+        f.write(data)
+    return memoryview(data).nbytes
@@ -0,0 +1,96 @@
+"""Per-stage timers and counters for the CLI and the GUI.
+
+A ``Recorder`` accumulates wall time, call count and the slowest call for
+each named stage (decode, transform, encode, ...) plus plain counters such
+as bytes read and written. Code marks its stages with ``stage()`` and
+``count()``, which record into the recorder made active on the current
+thread by ``recording()`` and do nothing when none is active. Stages
+should not be nested, so that their times add up to the measured total.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class Recorder:
+    def __init__(self):
+        self.stages = {}    # name -> [seconds, calls, max_seconds]
+        self.counters = {}  # name -> amount
+
+    def add(self, name: str, seconds: float, calls: int = 1, max_seconds: float = None):
+        entry = self.stages.setdefault(name, [0.0, 0, 0.0])
+        entry[0] += seconds
+        entry[1] += calls
+        entry[2] = max(entry[2], seconds if max_seconds is None else max_seconds)
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other):
+        """Adds another Recorder, or the ``to_dict()`` of one (as returned from a worker process)."""
+        if isinstance(other, Recorder):
+            other = other.to_dict()
+        for name, stats in other["stages"].items():
+            self.add(name, stats["seconds"], stats["calls"], stats["max_seconds"])
+        for name, amount in other["counters"].items():
+            self.count(name, amount)
+
+    def total_seconds(self) -> float:
+        return sum(entry[0] for entry in self.stages.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {name: {"seconds": seconds, "calls": calls, "max_seconds": max_seconds}
+                       for name, (seconds, calls, max_seconds) in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def format_table(self) -> str:
+        total = self.total_seconds()
+        lines = [f"{'Stage':18s} {'Calls':>7s} {'Total ms':>10s} {'Mean ms':>9s} {'Max ms':>9s} {'Share':>6s}"]
+        for name, (seconds, calls, max_seconds) in sorted(self.stages.items(), key=lambda item: -item[1][0]):
+            share = seconds / total if total > 0 else 0.0
+            lines.append(f"{name:18s} {calls:7d} {seconds * 1000:10.1f} {seconds * 1000 / calls:9.2f} "
+                         f"{max_seconds * 1000:9.2f} {share:6.1%}")
+        for name, amount in sorted(self.counters.items()):
+            value = f"{amount / 2**20:.1f} MB" if name.startswith("bytes_") else str(amount)
+            lines.append(f"{name:18s} {value}")
+        return "\n".join(lines)
+
+
+def active():
+    """Returns the recorder active on this thread, or None."""
+    return getattr(_local, "recorder", None)
+
+
+@contextmanager
+def recording(recorder: Recorder = None):
+    """Makes ``recorder`` (a new one by default) active on this thread for the duration of the block."""
+    recorder = recorder if recorder is not None else Recorder()
+    previous = active()
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+@contextmanager
+def stage(name: str):
+    recorder = active()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add(name, time.perf_counter() - start)
+
+
+def count(name: str, amount: int = 1):
+    recorder = active()
+    if recorder is not None:
+        recorder.count(name, amount)
@@ -0,0 +1,124 @@
+"""A staged thread pipeline with bounded queues between the stages.
+
+Each stage is a function run by its own group of threads. It takes one item
+from the queue in front of it and yields any number of items for the next
+stage; the last stage's items are collected and returned. Queues are
+bounded, so a slow stage holds the ones before it back instead of letting
+decoded images pile up in memory. Threads are enough because the heavy
+work (file reads, OpenCV decode/encode and the NumPy transforms) releases
+the GIL.
+
+Every stage records how long its threads were busy, starved (waiting for
+input) and blocked (waiting for room downstream). The stage with the
+highest busy share is the bottleneck: adding threads there is what raises
+throughput.
+"""
+import queue
+import threading
+import time
+
+# --- Constants ---
+DEFAULT_QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, func, threads: int = 1):
+        self.name = name
+        self.func = func
+        self.threads = max(1, int(threads))
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, busy: float, starved: float, blocked: float):
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+
+    def to_dict(self, elapsed: float) -> dict:
+        capacity = elapsed * self.threads
+        return {"name": self.name, "threads": self.threads, "items": self.items, "busy_seconds": self.busy,
+                "starved_seconds": self.starved, "blocked_seconds": self.blocked,
+                "utilization": self.busy / capacity if capacity > 0 else 0.0}
+
+
+def run_pipeline(items, stages: list, queue_size: int = DEFAULT_QUEUE_SIZE, on_error=None) -> tuple:
+    """Pushes items through the stages. Returns (outputs of the last stage, report).
+
+    ``on_error(stage_name, item, exception)`` is called when a stage function
+    raises; the item is dropped and the pipeline carries on. The report holds
+    per-stage statistics and the name of the bottleneck stage.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    outputs = []
+    outputs_lock = threading.Lock()
+    remaining = [stage.threads for stage in stages]
+    remaining_lock = threading.Lock()
+
+    def put(index: int, item) -> float:
+        """Hands an item to the stage after ``index``. Returns the time spent blocked."""
+        if index + 1 == len(stages):
+            with outputs_lock:
+                outputs.append(item)
+            return 0.0
+        start = time.perf_counter()
+        queues[index + 1].put(item)
+        return time.perf_counter() - start
+
+    def work(index: int):
+        stage, inbox = stages[index], queues[index]
+        while True:
+            start = time.perf_counter()
+            item = inbox.get()
+            starved = time.perf_counter() - start
+            if item is _DONE:
+                break
+            blocked = 0.0
+            start = time.perf_counter()
+            try:
+                for result in stage.func(item):
+                    blocked += put(index, result)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(stage.name, item, e)
+            stage.record(time.perf_counter() - start - blocked, starved, blocked)
+        with remaining_lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        # The last thread out tells every thread of the next stage that no more items are coming
+        if last and index + 1 < len(stages):
+            for _ in range(stages[index + 1].threads):
+                queues[index + 1].put(_DONE)
+
+    threads = [threading.Thread(target=work, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True)
+               for index, stage in enumerate(stages) for n in range(stage.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for item in items:
+        queues[0].put(item)
+    for _ in range(stages[0].threads):
+        queues[0].put(_DONE)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = [stage.to_dict(elapsed) for stage in stages]
+    bottleneck = max(report, key=lambda s: s["utilization"])["name"] if report else None
+    return outputs, {"elapsed": elapsed, "stages": report, "bottleneck": bottleneck}
+
+
+def format_report(report: dict) -> str:
+    """Formats a pipeline report as a table with the bottleneck marked."""
+    lines = [f"{'Stage':<12} {'Threads':>7} {'Items':>7} {'Busy':>6} {'Starved s':>10} {'Blocked s':>10}"]
+    for s in report["stages"]:
+        marker = "  <- bottleneck" if s["name"] == report["bottleneck"] else ""
+        lines.append(f"{s['name']:<12} {s['threads']:>7} {s['items']:>7} {s['utilization']:>6.0%} "
+                     f"{s['starved_seconds']:>10.2f} {s['blocked_seconds']:>10.2f}{marker}")
+    return "\n".join(lines)
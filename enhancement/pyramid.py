@@ -0,0 +1,65 @@
+"""Multi-resolution display pyramid.
+
+Built once per loaded image by repeated 2x area downsampling. A display
+buffer for any canvas size is resized from the smallest level that is still
+at least that large, so redraw cost depends on the screen size rather than
+the image size. The last few resized buffers are cached by size. Gamma and
+equalization are point operations, so callers apply their LUT to the
+display-sized buffer instead of to the full-resolution image.
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from . import image_io, transforms
+
+# --- Constants ---
+MIN_LEVEL_SIZE = 64
+RESIZE_CACHE_SIZE = 8
+
+
+class DisplayPyramid:
+    def __init__(self, image: np.ndarray, min_level_size: int = MIN_LEVEL_SIZE, cache_size: int = RESIZE_CACHE_SIZE):
+        self.levels = [image]
+        while min(self.levels[-1].shape[:2]) // 2 >= min_level_size:
+            level = self.levels[-1]
+            half = (level.shape[1] // 2, level.shape[0] // 2)
+            self.levels.append(cv2.resize(level, half, interpolation=cv2.INTER_AREA))
+        self.shape = image.shape
+        self._cache_size = cache_size
+        self._resized = OrderedDict()
+        # The GUI's worker thread and Tk thread both read from the cache
+        self._lock = threading.Lock()
+
+    def level_for(self, size: tuple) -> np.ndarray:
+        """Returns the smallest level at least ``size`` = (width, height), or the full image."""
+        width, height = size
+        for level in reversed(self.levels):
+            if level.shape[1] >= width and level.shape[0] >= height:
+                return level
+        return self.levels[0]
+
+    def resized(self, size: tuple) -> np.ndarray:
+        """Returns the image resized to ``size`` = (width, height). Treat the result as read-only."""
+        size = (int(size[0]), int(size[1]))
+        with self._lock:
+            cached = self._resized.get(size)
+            if cached is not None:
+                self._resized.move_to_end(size)
+                return cached
+        level = self.level_for(size)
+        resized = level if level.shape[1::-1] == size else cv2.resize(level, size, interpolation=cv2.INTER_AREA)
+        with self._lock:
+            self._resized[size] = resized
+            while len(self._resized) > self._cache_size:
+                self._resized.popitem(last=False)
+        return resized
+
+    def display(self, size: tuple, lut: np.ndarray = None, max_value: int = None) -> np.ndarray:
+        """Returns an 8-bit display buffer of ``size`` with ``lut`` applied at display resolution."""
+        resized = self.resized(size)
+        if lut is not None:
+            resized = transforms.apply_lut(resized, lut)
+        return image_io.to_8bit(resized, max_value)
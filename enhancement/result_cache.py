@@ -0,0 +1,176 @@
+"""On-disk index of CLI results for incremental re-runs.
+
+The index lives next to the outputs (``.enhance_cache.json``). Each result
+is keyed by the SHA-256 of the input file, the technique, its parameters
+(gamma value, CLAHE clip limit and tiles, window), the tool version, the
+output format and the output's path, so two inputs with the same content
+but different names get entries of their own.
+Input paths also remember their size and mtime, so an unchanged file is
+recognised from a ``stat`` alone without being re-read. A result is reused
+only while its output files are still at the expected path with the size
+and mtime that were recorded.
+
+When the recorded outputs grow past the size limit, the least recently used
+entries are dropped from the index. Their files are left in place and will
+be regenerated if they are needed again.
+"""
+import hashlib
+import json
+import os
+import time
+
+from . import __version__
+
+# --- Constants ---
+CACHE_INDEX_NAME = ".enhance_cache.json"
+DEFAULT_CACHE_LIMIT = 10 * 1024 ** 3
+INDEX_FORMAT = 2
+
+
+def hash_bytes(data: bytes) -> str:
+    """Same digest as hash_file, for file contents already in memory."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def format_parameter(param) -> str:
+    """Formats a variant parameter for a key: "0.70" for gamma, "2_8_8" for CLAHE, "auto_auto_linear" for a default window."""
+    if param is None:
+        return ""
+    if isinstance(param, tuple):
+        flat = []
+        for value in param:
+            flat.extend(value if isinstance(value, tuple) else [value])
+        return "_".join("auto" if value is None else f"{value:g}" if isinstance(value, float) else str(value)
+                        for value in flat)
+    return f"{param:.2f}"
+
+
+def variant_key(content_hash: str, technique: str, param, with_histogram: bool = True, output_format: tuple = None,
+                output: str = None) -> str:
+    """Returns the cache key of one result.
+
+    ``output_format`` is an (extension, png_compression) pair (``image_io.OutputFormat``),
+    PNG at the default level when omitted. ``output`` is the output image's path
+    relative to the output directory.
+    """
+    extension, png_compression = output_format or ("png", None)
+    parameter = format_parameter(param)
+    # A result without its histogram plot, or in another format or compression, must not satisfy a later run that wants one
+    outputs = ("" if with_histogram else ":nohist") + ("" if extension == "png" else f":{extension}")
+    if extension == "png" and png_compression is not None:
+        outputs += f":png{png_compression}"
+    if output:
+        outputs += f":{output}"
+    return f"{content_hash}:{technique}:{parameter}:{__version__}{outputs}"
+
+
+def file_signature(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class ResultCache:
+    def __init__(self, output_dir: str, limit_bytes: int = DEFAULT_CACHE_LIMIT):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, CACHE_INDEX_NAME)
+        self.limit_bytes = limit_bytes
+        self.inputs = {}   # input path -> {"signature": [size, mtime_ns], "hash": sha256}
+        self.entries = {}  # variant key -> {"outputs": [[path, size, mtime_ns], ...], "bytes": n, "used": t}
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("format") == INDEX_FORMAT:
+            self.inputs = data.get("inputs", {})
+            self.entries = data.get("entries", {})
+
+    def save(self):
+        self.evict()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": INDEX_FORMAT, "inputs": self.inputs, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def known_hash(self, path: str):
+        """Returns the recorded content hash if the file's size and mtime are unchanged (no read needed)."""
+        record = self.inputs.get(path)
+        try:
+            if record and record["signature"] == file_signature(path):
+                return record["hash"]
+        except OSError:
+            pass
+        return None
+
+    def previous_hash(self, path: str):
+        record = self.inputs.get(path)
+        return record["hash"] if record else None
+
+    def is_fresh(self, key: str, output: str = None) -> bool:
+        """True if the key's outputs are unchanged on disk and, when given, the image was written to ``output``."""
+        entry = self.entries.get(key)
+        if entry is None or not entry["outputs"]:
+            return False
+        expected = os.path.normcase(os.path.abspath(os.path.join(self.output_dir, output))) if output else None
+        if expected and os.path.normcase(os.path.abspath(entry["outputs"][0][0])) != expected:
+            return False
+        try:
+            return all(file_signature(path) == [size, mtime] for path, size, mtime in entry["outputs"])
+        except OSError:
+            return False
+
+    def fresh_keys(self, content_hash: str, variants: list, with_histogram: bool = True, output_format: tuple = None,
+                   outputs: list = None) -> set:
+        """Returns the keys of the variants already cached. ``outputs`` lists each variant's output image path."""
+        if content_hash is None:
+            return set()
+        outputs = outputs or [None] * len(variants)
+        keys = ((variant_key(content_hash, technique, param, with_histogram, output_format, output), output)
+                for (technique, param), output in zip(variants, outputs))
+        return {key for key, output in keys if self.is_fresh(key, output)}
+
+    def touch(self, keys):
+        now = time.time()
+        for key in keys:
+            if key in self.entries:
+                self.entries[key]["used"] = now
+
+    def record_input(self, path: str, signature: list, content_hash: str):
+        previous = self.previous_hash(path)
+        if previous is not None and previous != content_hash:
+            # Forget the old content's results whose files were just overwritten. Other inputs with
+            # the same old content keep theirs, as do this input's outputs that were not rewritten.
+            prefix = f"{previous}:"
+            for key in [k for k in self.entries if k.startswith(prefix) and not self.is_fresh(k)]:
+                del self.entries[key]
+        self.inputs[path] = {"signature": signature, "hash": content_hash}
+
+    def record(self, key: str, output_paths: list):
+        outputs = [[path] + file_signature(path) for path in output_paths]
+        self.entries[key] = {"outputs": outputs, "bytes": sum(o[1] for o in outputs), "used": time.time()}
+
+    def evict(self):
+        total = sum(entry["bytes"] for entry in self.entries.values())
+        if total <= self.limit_bytes:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["used"]):
+            total -= self.entries.pop(key)["bytes"]
+            self.evicted += 1
+            if total <= self.limit_bytes:
+                break
+        live_hashes = {key.split(":", 1)[0] for key in self.entries}
+        self.inputs = {path: record for path, record in self.inputs.items() if record["hash"] in live_hashes}
@@ -0,0 +1,242 @@
+"""Micro-batching engine behind the local enhancement server.
+
+Requests are queued in a bounded queue; ``submit`` fails fast with
+``queue.Full`` when it is full so the caller can push back instead of
+piling up work. A dispatcher thread hands requests to a pool of warm worker
+processes in batches: it takes whatever is queued (up to ``max_batch``) as
+soon as a worker slot is free, waiting at most ``max_delay`` for stragglers,
+so batches stay small when the server is idle and grow under load. Workers
+keep OpenCV, NumPy and the gamma LUTs loaded for their whole lifetime.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from . import clahe, histograms, image_io, metrics, transforms
+
+# --- Constants ---
+DEFAULT_MAX_BATCH = 8
+DEFAULT_MAX_DELAY = 0.002
+DEFAULT_QUEUE_SIZE = 64
+LATENCY_WINDOW = 10000
+PERCENTILES = (50, 90, 99)
+
+
+def _init_worker():
+    # One request at a time per process; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    clahe.set_num_threads(1)
+    transforms.gamma_lut_family(transforms.GAMMA_MIN, transforms.GAMMA_MAX)
+
+
+def enhance_encoded(data: bytes, technique: str, param=None, with_histogram: bool = False) -> dict:
+    """Decodes an image, applies one technique and returns the PNG with optional processed counts.
+
+    ``param`` is the gamma value, a WindowParams or a ClaheParams, depending on the technique.
+    """
+    with metrics.stage("decode"):
+        image, max_value = image_io.decode_image(data)
+    lut_max = 255 if image.dtype == np.uint8 else max_value
+    service = lut = None
+    if technique == "clahe":
+        with metrics.stage("transform"):
+            enhanced = clahe.apply_clahe(image, param.clip_limit, param.tiles, lut_max)
+    else:
+        with metrics.stage("histogram"):
+            if with_histogram or technique == "hist_eq":
+                service = histograms.HistogramService(image, max_value)
+                lut = service.lut_for(technique, param)
+            elif technique == "window":
+                lut = transforms.window_lut(*transforms.resolve_window(param, lut_max), max_value=lut_max)
+            else:
+                lut = transforms.gamma_lut(param, lut_max)
+        with metrics.stage("transform"):
+            enhanced = transforms.apply_lut(image, lut)
+    with metrics.stage("encode"):
+        ok, png = cv2.imencode(".png", enhanced)
+        if not ok:
+            raise IOError("OpenCV could not encode the result as PNG.")
+    counts = None
+    if with_histogram:
+        with metrics.stage("histogram"):
+            # CLAHE output is not a remap of the source histogram, so it is counted directly
+            counts = service.processed_counts(lut) if service else histograms.compute_histogram(enhanced)
+    return {"png": png.tobytes(), "counts": counts, "max_value": lut_max, "shape": enhanced.shape}
+
+
+def process_batch(jobs: list) -> list:
+    """Worker entry point. Each job's error is returned in its result so one bad image never fails the batch."""
+    results = []
+    for job in jobs:
+        with metrics.recording() as recorder:
+            try:
+                result = enhance_encoded(job["data"], job["technique"], job.get("param"), job.get("histogram", False))
+            except ValueError as e:
+                result = {"error": str(e), "status": 400}
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}", "status": 500}
+        result["metrics"] = recorder.to_dict()
+        results.append(result)
+    return results
+
+
+class LatencyTracker:
+    """Keeps the most recent request latencies and reports their percentiles."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = np.array(self._samples)
+            count = self.count
+        if samples.size == 0:
+            return {"count": count, "window": 0}
+        summary = {"count": count, "window": int(samples.size), "mean_ms": float(samples.mean() * 1000),
+                   "max_ms": float(samples.max() * 1000)}
+        for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+            summary[f"p{p}_ms"] = float(value * 1000)
+        return summary
+
+
+class MicroBatcher:
+    def __init__(self, workers: int, max_batch: int = DEFAULT_MAX_BATCH, max_delay: float = DEFAULT_MAX_DELAY,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.workers = workers
+        self.stages = metrics.Recorder()
+        self.batches = 0
+        self.batched_jobs = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closing = threading.Event()
+        # At most one batch running and one waiting per worker
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="micro-batcher", daemon=True)
+
+    def start(self):
+        # Start every worker now so the first requests do not pay for process startup and imports
+        for future in [self._pool.submit(process_batch, []) for _ in range(self.workers)]:
+            future.result()
+        self._dispatcher.start()
+
+    def submit(self, job: dict) -> Future:
+        """Queues a job and returns a Future for its result. Raises queue.Full when the queue is full."""
+        if self._closing.is_set():
+            raise RuntimeError("The micro-batcher is closed.")
+        future = Future()
+        try:
+            self._queue.put_nowait((job, future))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise
+        return future
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def close(self):
+        """Stops dispatching, fails the jobs still queued and shuts the workers down. Never blocks on a full queue."""
+        self._closing.set()
+        try:
+            # Wakes the dispatcher if it is waiting on an empty queue; a full queue means it is not
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self._dispatcher.is_alive():
+            self._dispatcher.join(timeout=5)
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("The server is shutting down."))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "queue_size": self._queue.maxsize,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "mean_batch_size": self.batched_jobs / self.batches if self.batches else 0.0,
+                **self.stages.to_dict(),
+            }
+
+    def _collect(self, first) -> tuple:
+        """Returns (batch, closing). Drains queued jobs, then waits up to max_delay for more."""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, self._closing.is_set()
+
+    def _dispatch(self):
+        closing = False
+        while not closing:
+            first = self._queue.get()
+            if first is None or self._closing.is_set():
+                if first is not None:
+                    first[1].set_exception(RuntimeError("The server is shutting down."))
+                return
+            # Under load this waits for a free worker while more requests queue up behind it
+            self._slots.acquire()
+            batch, closing = self._collect(first)
+            with self._stats_lock:
+                self.batches += 1
+                self.batched_jobs += len(batch)
+            try:
+                future = self._pool.submit(process_batch, [job for job, _ in batch])
+            except RuntimeError as e:  # The pool is shutting down
+                self._slots.release()
+                for _, client in batch:
+                    client.set_exception(e)
+                return
+            future.add_done_callback(lambda done, batch=batch: self._complete(batch, done))
+
+    def _complete(self, batch: list, done: Future):
+        self._slots.release()
+        try:
+            results = done.result()
+        except Exception as e:
+            for _, client in batch:
+                client.set_exception(e)
+            return
+        with self._stats_lock:
+            for result in results:
+                self.stages.merge(result["metrics"])
+        for (_, client), result in zip(batch, results):
+            result["batch_size"] = len(batch)
+            client.set_result(result)
@@ -0,0 +1,270 @@
+"""Strip-wise execution of the point transforms with a fixed memory ceiling.
+
+The source is read and transformed in horizontal strips sized to fit the
+memory limit. ``.npy`` and uncompressed DICOM sources are read strip by
+strip with explicit seeks and reads, so only the current strip is ever
+resident; other formats are decoded once by OpenCV, which has no partial
+decoding, and then streamed the same way. 8-bit and 16-bit data are both
+supported.
+
+Outputs are appended strip by strip as well: ``.npy`` as raw rows after its
+header and PNG through ``image_io.PngStreamWriter``. OpenCV can only encode
+TIFF and BMP from a whole image, so those outputs need the full image in
+memory and do not honour the limit.
+
+Histogram equalization runs in two passes: the first accumulates the global
+histogram strip by strip, the second applies the LUT derived from it, so the
+result is identical to ``cv2.equalizeHist`` on the whole image.
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from . import histograms, image_io, metrics, transforms
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# --- Constants ---
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+STRIP_COPIES = 4  # Source strip, output strip and the PNG encoder's two working copies
+
+
+def peak_rss_bytes(children: bool = False) -> int:
+    """Returns the peak resident set size of this process (or its reaped children), or None if unknown."""
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def strip_rows_for(width: int, memory_limit: int = DEFAULT_MEMORY_LIMIT, itemsize: int = 1) -> int:
+    """Returns how many rows fit in one strip.
+
+    The budget covers STRIP_COPIES strip-sized buffers: the source strip, its
+    output and the encoder's working copies.
+    """
+    return max(1, int(memory_limit // (STRIP_COPIES * max(width, 1) * itemsize)))
+
+
+def iter_strips(height: int, strip_rows: int):
+    """Yields row slices covering ``height`` rows in steps of ``strip_rows``."""
+    for start in range(0, height, strip_rows):
+        yield slice(start, min(start + strip_rows, height))
+
+
+class StripSource:
+    """A grayscale image read one strip of rows at a time.
+
+    ``.npy`` (C order) and uncompressed DICOM files are read from disk on each
+    ``read`` and nothing stays mapped; any other format is decoded up front.
+    """
+
+    def __init__(self, path: str):
+        self._file = None
+        self._image = None
+        if image_io.is_dicom(path):
+            meta = image_io.read_dicom_metadata(path)
+            self.shape, self.dtype, self.max_value = meta["shape"], np.dtype(meta["dtype"]), meta["max_value"]
+            self._file = open(path, "rb")
+            self._read = lambda start, stop: image_io.read_dicom_rows(self._file, meta, start, stop)
+            return
+        header = _npy_header(path) if path.lower().endswith(".npy") else None
+        if header is None:
+            self._image, self.max_value = image_io.read_image_with_max(path)
+            self.shape, self.dtype = self._image.shape, self._image.dtype
+            self._read = lambda start, stop: self._image[start:stop]
+            return
+        offset, self.shape, stored_dtype = header
+        self.dtype = stored_dtype.newbyteorder("=")
+        if len(self.shape) != 2 or self.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"Expected a 2-D uint8 or uint16 array, got {len(self.shape)}-D {self.dtype}.")
+        self.max_value = int(np.iinfo(self.dtype).max)
+        self._file = open(path, "rb")
+        self._read = lambda start, stop: self._read_raw(offset, stored_dtype, start, stop)
+
+    def _read_raw(self, offset: int, stored_dtype: np.dtype, start: int, stop: int) -> np.ndarray:
+        columns = self.shape[1]
+        self._file.seek(offset + start * columns * stored_dtype.itemsize)
+        rows = np.fromfile(self._file, dtype=stored_dtype, count=(stop - start) * columns).reshape(-1, columns)
+        return rows.astype(self.dtype, copy=False)
+
+    def read(self, rows: slice) -> np.ndarray:
+        strip = np.ascontiguousarray(self._read(rows.start, rows.stop))
+        if len(strip) != rows.stop - rows.start:
+            raise ValueError("The image file is shorter than its header says.")
+        return strip
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _npy_header(path: str):
+    """Returns (data offset, shape, dtype) of a C-order .npy file, or None when it must be loaded whole."""
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        else:
+            return None
+        return None if fortran_order else (f.tell(), shape, dtype)
+
+
+class _NpyWriter:
+    def __init__(self, path: str, shape: tuple, dtype):
+        self._file = open(path, "wb")
+        np.lib.format.write_array_header_1_0(self._file, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                          "fortran_order": False, "shape": tuple(shape)})
+
+    def write(self, strip: np.ndarray):
+        self._file.write(np.ascontiguousarray(strip))
+
+    def close(self):
+        self._file.close()
+
+
+class _WholeImageWriter:
+    """Collects every strip and encodes at the end, for the formats OpenCV cannot write incrementally."""
+
+    def __init__(self, path: str, shape: tuple, dtype, output_format: image_io.OutputFormat):
+        self.path, self.output_format = path, output_format
+        self.image = np.empty(shape, dtype=dtype)
+        self._row = 0
+
+    def write(self, strip: np.ndarray):
+        self.image[self._row:self._row + len(strip)] = strip
+        self._row += len(strip)
+
+    def close(self):
+        if self._row < len(self.image):
+            self.image = None  # Stopped by an error; nothing to encode
+            return
+        with metrics.stage("encode"):
+            ok = cv2.imwrite(self.path, self.image, image_io.imwrite_params(self.output_format))
+        self.image = None
+        if not ok:
+            raise IOError(f"OpenCV could not write: {self.path}")
+
+
+def open_writer(path: str, shape: tuple, dtype, output_format: image_io.OutputFormat = image_io.OutputFormat()):
+    """Opens a strip writer for path: streamed for .npy and .png, whole-image for anything else."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return _NpyWriter(path, shape, dtype)
+    if extension == ".png":
+        return image_io.PngStreamWriter(path, shape, dtype, output_format.png_compression)
+    return _WholeImageWriter(path, shape, dtype, output_format)
+
+
+def open_source(path: str) -> tuple:
+    """Opens a grayscale image for strip-wise reading. Returns (StripSource, max_value)."""
+    source = StripSource(path)
+    return source, source.max_value
+
+
+def streaming_histogram(source: StripSource, strip_rows: int) -> np.ndarray:
+    """Accumulates the exact global histogram one strip at a time."""
+    counts = np.zeros(256 if source.dtype == np.uint8 else 65536, dtype=np.int64)
+    for rows in iter_strips(source.shape[0], strip_rows):
+        with metrics.stage("read"):
+            strip = source.read(rows)
+        with metrics.stage("histogram"):
+            counts += histograms.compute_histogram(strip)
+    return counts
+
+
+def lut_for_source(source: StripSource, technique: str, param, strip_rows: int, max_value: int = 255) -> tuple:
+    """Returns (lut, source_counts). Equalization needs the first histogram pass; gamma and window do not.
+
+    ``param`` is the gamma value, or a resolved WindowParams for "window". CLAHE is
+    not a point transform and cannot be done strip by strip.
+    """
+    if source.dtype == np.uint8:
+        max_value = 255
+    if technique == "hist_eq":
+        counts = streaming_histogram(source, strip_rows)
+        return histograms.equalization_lut(counts, max_value), counts
+    if technique == "gamma":
+        return transforms.gamma_lut(param, max_value), None
+    if technique == "window":
+        return transforms.window_lut(*param, max_value=max_value), None
+    raise ValueError(f"'{technique}' cannot be processed in strips; only point transforms can.")
+
+
+def apply_lut_tiled(source: StripSource, writer, lut: np.ndarray, strip_rows: int,
+                    collect_histogram: bool = False) -> np.ndarray:
+    """Applies a LUT strip by strip from ``source`` to ``writer``. Optionally returns the source histogram."""
+    counts = None
+    for rows in iter_strips(source.shape[0], strip_rows):
+        with metrics.stage("read"):
+            strip = source.read(rows)
+        if collect_histogram:
+            with metrics.stage("histogram"):
+                strip_counts = histograms.compute_histogram(strip)
+            counts = strip_counts if counts is None else counts + strip_counts
+        with metrics.stage("transform"):
+            processed = transforms.apply_lut(strip, lut)
+        del strip
+        with metrics.stage("write"):
+            writer.write(processed)
+    return counts
+
+
+def enhance_tiled(source_path: str, output_path: str, technique: str, param=None,
+                  memory_limit: int = DEFAULT_MEMORY_LIMIT, with_histogram: bool = True,
+                  output_format: image_io.OutputFormat = image_io.OutputFormat()) -> dict:
+    """Enhances one image strip-wise and writes it to ``output_path``.
+
+    ``.npy`` and ``.png`` outputs are appended strip by strip (PNG with the
+    compression level of ``output_format``). TIFF and BMP are encoded by
+    OpenCV from the whole image, so they need it in memory. A window with no
+    center or width takes it from the DICOM header, or else the full range.
+    Returns the processed histogram (None without ``with_histogram``) and run
+    statistics.
+    """
+    with metrics.stage("decode"):
+        source, max_value = open_source(source_path)
+    with source:
+        metrics.count("bytes_read", os.path.getsize(source_path))
+        height, width = source.shape
+        metrics.count("pixels", height * width)
+        strip_rows = strip_rows_for(width, memory_limit, source.dtype.itemsize)
+
+        if technique == "window":
+            param = transforms.resolve_window(param, 255 if source.dtype == np.uint8 else max_value,
+                                              image_io.header_window(source_path))
+        lut, source_counts = lut_for_source(source, technique, param, strip_rows, max_value)
+
+        writer = open_writer(output_path, (height, width), source.dtype, output_format)
+        try:
+            counted = apply_lut_tiled(source, writer, lut, strip_rows,
+                                      collect_histogram=with_histogram and source_counts is None)
+        finally:
+            writer.close()
+    source_counts = source_counts if source_counts is not None else counted
+    metrics.count("bytes_written", os.path.getsize(output_path))
+
+    return {
+        "processed_counts": histograms.remap_histogram(source_counts, lut) if with_histogram else None,
+        "shape": (height, width),
+        "max_value": max_value if lut.dtype == np.uint16 else 255,
+        "strip_rows": strip_rows,
+        "strips": -(-height // strip_rows),
+        "peak_rss": peak_rss_bytes(),
+    }
@@ -0,0 +1,169 @@
+"""Point transforms and their lookup tables.
+
+Gamma tables are built with vectorized NumPy, quantized to the GUI slider
+resolution and kept in a bounded LRU cache that lives for the whole process,
+so the CLI and the GUI share the exact same tables.
+
+Window/level tables follow the DICOM VOI LUT functions (PS3.3 C.11.2.1.2):
+``linear`` clips to [center - width/2, center + width/2] and stretches that
+range over the output, ``sigmoid`` rolls off smoothly around the center.
+
+8-bit images use 256-entry tables applied with ``cv2.LUT``. 16-bit images
+(including 12-bit data stored in 16 bits) use 65536-entry tables scaled to
+the image's maximum value and applied with ``np.take``.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+# --- Constants ---
+GAMMA_MIN = 0.1
+GAMMA_MAX = 5.0
+GAMMA_DECIMALS = 2
+LUT_CACHE_SIZE = 1024
+HIGH_BIT_LUT_CACHE_SIZE = 32  # 128 KB per table
+VOI_FUNCTIONS = ("linear", "sigmoid")
+WINDOW_DECIMALS = 2
+
+# A center or width of None is filled in by resolve_window (from the DICOM header or the full range)
+WindowParams = namedtuple("WindowParams", "center width function", defaults=(None, None, "linear"))
+
+_LEVELS = np.arange(256, dtype=np.float64) / 255.0
+
+
+def quantize_gamma(gamma: float) -> float:
+    """Rounds gamma to the resolution used for LUT caching.
+
+    Raises ValueError for NaN, infinity, and values that round to zero or below.
+    """
+    gamma = float(gamma)
+    if not np.isfinite(gamma):
+        raise ValueError("Gamma value must be a finite number.")
+    quantized = round(gamma, GAMMA_DECIMALS)
+    if quantized <= 0:
+        raise ValueError(f"Gamma value must be at least {10 ** -GAMMA_DECIMALS:g}.")
+    return quantized
+
+
+def _build_gamma_luts(gammas: np.ndarray) -> np.ndarray:
+    """Builds one 256-entry uint8 table per gamma value as a (len(gammas), 256) array."""
+    inv_gammas = 1.0 / np.asarray(gammas, dtype=np.float64).reshape(-1, 1)
+    return (np.power(_LEVELS, inv_gammas) * 255).astype(np.uint8)
+
+
+@lru_cache(maxsize=1)
+def _gamma_family(start: float, stop: float) -> tuple:
+    step = 10 ** -GAMMA_DECIMALS
+    count = int(round((stop - start) / step)) + 1
+    gammas = np.round(start + np.arange(count) * step, GAMMA_DECIMALS)
+    luts = _build_gamma_luts(gammas)
+    gammas.setflags(write=False)
+    luts.setflags(write=False)
+    return gammas, luts
+
+
+def gamma_lut_family(start: float = GAMMA_MIN, stop: float = GAMMA_MAX) -> tuple:
+    """Returns (gammas, luts) covering [start, stop] at the quantization step.
+
+    ``luts[i]`` is the table for ``gammas[i]``. Both arrays are read-only and
+    computed once per process.
+    """
+    return _gamma_family(quantize_gamma(start), quantize_gamma(stop))
+
+
+@lru_cache(maxsize=LUT_CACHE_SIZE)
+def _gamma_lut(gamma: float) -> np.ndarray:
+    if GAMMA_MIN <= gamma <= GAMMA_MAX:
+        gammas, luts = gamma_lut_family()
+        return luts[int(round((gamma - gammas[0]) * 10 ** GAMMA_DECIMALS))]
+    lut = _build_gamma_luts([gamma])[0]
+    lut.setflags(write=False)
+    return lut
+
+
+@lru_cache(maxsize=HIGH_BIT_LUT_CACHE_SIZE)
+def _gamma_lut_high_bit(gamma: float, max_value: int) -> np.ndarray:
+    # Entries above max_value cannot occur in valid data; clamp them to the top of the curve
+    levels = np.minimum(np.arange(65536, dtype=np.float64), max_value) / max_value
+    lut = (np.power(levels, 1.0 / gamma) * max_value).astype(np.uint16)
+    lut.setflags(write=False)
+    return lut
+
+
+def gamma_lut(gamma: float, max_value: int = 255) -> np.ndarray:
+    """Returns the cached, read-only table for a gamma value.
+
+    ``max_value`` 255 gives the 256-entry uint8 table; anything else gives a
+    65536-entry uint16 table that maps [0, max_value] onto itself.
+    """
+    if max_value == 255:
+        return _gamma_lut(quantize_gamma(gamma))
+    return _gamma_lut_high_bit(quantize_gamma(gamma), int(max_value))
+
+
+def resolve_window(window: WindowParams, max_value: int = 255, default: tuple = None) -> WindowParams:
+    """Fills in a missing center or width from ``default`` (center, width), or else the full [0, max_value] range."""
+    center, width = default or ((max_value + 1) / 2, max_value + 1)
+    return WindowParams(center if window.center is None else window.center,
+                        width if window.width is None else window.width, window.function)
+
+
+@lru_cache(maxsize=HIGH_BIT_LUT_CACHE_SIZE)
+def _window_lut(center: float, width: float, function: str, max_value: int) -> np.ndarray:
+    size, dtype = (256, np.uint8) if max_value == 255 else (65536, np.uint16)
+    levels = np.minimum(np.arange(size, dtype=np.float64), max_value)
+    if function == "sigmoid":
+        values = max_value / (1.0 + np.exp(-4.0 * (levels - center) / width))
+    elif width <= 1:
+        # A one-level window is a threshold
+        values = np.where(levels > center - 0.5, max_value, 0)
+    else:
+        values = ((levels - (center - 0.5)) / (width - 1) + 0.5) * max_value
+    lut = np.clip(np.rint(values), 0, max_value).astype(dtype)
+    lut.setflags(write=False)
+    return lut
+
+
+def window_lut(center: float, width: float, function: str = "linear", max_value: int = 255) -> np.ndarray:
+    """Returns the cached, read-only window/level table. Raises ValueError on bad parameters.
+
+    ``center`` and ``width`` are in pixel values; the window is stretched over
+    [0, max_value], as a uint8 table for 255 and a uint16 table otherwise.
+    """
+    if function not in VOI_FUNCTIONS:
+        raise ValueError(f"Unknown VOI function '{function}' (choose from {', '.join(VOI_FUNCTIONS)})")
+    if width is None or center is None:
+        raise ValueError("Window center and width must be resolved before building a table.")
+    if width <= 0 or (function == "linear" and width < 1):
+        raise ValueError("Window width must be at least 1 (greater than zero for sigmoid).")
+    return _window_lut(round(float(center), WINDOW_DECIMALS), round(float(width), WINDOW_DECIMALS), function, int(max_value))
+
+
+def apply_lut(image: np.ndarray, lut: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Applies a 256-entry table to a uint8 image or a 65536-entry table to a uint16 image.
+
+    ``out``, if given, receives the result (it must match the image's shape and the table's dtype).
+    """
+    if image.dtype == np.uint8 and lut.size == 256:
+        return cv2.LUT(image, lut, dst=out)
+    return np.take(lut, image, out=out)
+
+
+def apply_gamma_correction(image: np.ndarray, gamma: float, max_value: int = None) -> np.ndarray:
+    """Applies Power-Law (Gamma) transformation to a grayscale image."""
+    if image.dtype == np.uint8:
+        return cv2.LUT(image, gamma_lut(gamma))
+    return apply_lut(image, gamma_lut(gamma, max_value or np.iinfo(image.dtype).max))
+
+
+def apply_histogram_equalization(image: np.ndarray, max_value: int = None) -> np.ndarray:
+    """Applies Histogram Equalization to a grayscale image. 16-bit images keep their bit depth."""
+    if image.dtype == np.uint8:
+        return cv2.equalizeHist(image)
+    from . import histograms
+
+    counts = histograms.compute_histogram(image)
+    return apply_lut(image, histograms.equalization_lut(counts, max_value or np.iinfo(image.dtype).max))
+
@@ -0,0 +1,49 @@
+"""enhancement.clahe against cv2.createCLAHE."""
+import cv2
+import numpy as np
+import pytest
+
+from enhancement import clahe
+
+# --- Constants ---
+SHAPES = [(37, 53), (64, 64), (101, 91), (17, 300)]
+TILE_GRIDS = [(1, 1), (3, 5), (8, 8), (7, 2)]
+
+
+def smooth_image(shape: tuple, dtype) -> np.ndarray:
+    """Random noise blurred into the kind of local contrast CLAHE works on."""
+    rng = np.random.default_rng(sum(shape))
+    image = rng.integers(0, np.iinfo(dtype).max, shape, endpoint=True).astype(dtype)
+    return cv2.GaussianBlur(image, (5, 5), 0)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+@pytest.mark.parametrize("shape", SHAPES, ids=lambda shape: "{}x{}".format(*shape))
+@pytest.mark.parametrize("tiles", TILE_GRIDS, ids=lambda tiles: "{}x{}".format(*tiles))
+@pytest.mark.parametrize("clip_limit", [0.0, 2.0, 40.0])
+def test_tables_and_interpolation_match_opencv(dtype, shape, tiles, clip_limit):
+    image = smooth_image(shape, dtype)
+    expected = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tiles).apply(image)
+
+    histograms, tile_size = clahe.tile_histograms(image, tiles)
+    luts = clahe.clahe_luts(histograms, tile_size, clip_limit, dtype)
+    np.testing.assert_array_equal(clahe.interpolate(image, luts, tile_size), expected)
+    np.testing.assert_array_equal(clahe.apply_clahe(image, clip_limit, tiles), expected)
+
+
+@pytest.mark.parametrize("tiles", TILE_GRIDS, ids=lambda tiles: "{}x{}".format(*tiles))
+def test_tile_histograms_count_every_padded_pixel(tiles):
+    image = (smooth_image((101, 91), np.uint16) >> 4).astype(np.uint16)
+    # A few out-of-range values, which are counted in the top bin
+    image[0, :3] = 4096 + 7
+
+    histograms, (tile_w, tile_h) = clahe.tile_histograms(image, tiles, max_value=4095)
+    assert histograms.shape == (tiles[1], tiles[0], 4096)
+    assert (histograms.sum(axis=2) == tile_w * tile_h).all()
+    padded = np.minimum(clahe._padded(image, tiles), 4095)
+    np.testing.assert_array_equal(histograms[0, 0], np.bincount(padded[:tile_h, :tile_w].ravel(), minlength=4096))
+
+
+def test_rejects_grid_finer_than_image():
+    with pytest.raises(ValueError, match="finer"):
+        clahe.apply_clahe(np.zeros((4, 4), dtype=np.uint8), tiles=(8, 8))
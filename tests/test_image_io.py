@@ -0,0 +1,212 @@
+"""DICOM reading in enhancement.image_io, checked against synthetic files built in memory."""
+import struct
+
+import numpy as np
+import pytest
+
+from enhancement import image_io
+
+# --- Constants ---
+LONG_VRS = (b"OB", b"OW", b"SQ", b"UN", b"UT")
+JPEG_BASELINE = "1.2.840.10008.1.2.4.50"
+
+
+def _padded(value) -> bytes:
+    data = value.encode("ascii") if isinstance(value, str) else value
+    return data + b" " if len(data) % 2 else data
+
+
+def element(group: int, number: int, vr: str, value, explicit: bool = True, length: int = None) -> bytes:
+    """Encodes one little-endian data element. ``length`` overrides the value's length (undefined lengths)."""
+    data = _padded(value)
+    length = len(data) if length is None else length
+    tag = struct.pack("<HH", group, number)
+    if not explicit:
+        return tag + struct.pack("<I", length) + data
+    vr = vr.encode("ascii")
+    if vr in LONG_VRS:
+        return tag + vr + b"\0\0" + struct.pack("<I", length) + data
+    return tag + vr + struct.pack("<H", length) + data
+
+
+def us(value: int) -> bytes:
+    return struct.pack("<H", value)
+
+
+def undefined_sequence(explicit: bool) -> bytes:
+    """A referenced-image sequence of undefined length whose item holds a decoy window center."""
+    item = element(0x0008, 0x1150, "UI", "1.2.3", explicit) + element(0x0028, 0x1050, "DS", "99999", explicit)
+    return (element(0x0008, 0x1140, "SQ", b"", explicit, length=image_io.UNDEFINED_LENGTH)
+            + struct.pack("<HHI", 0xFFFE, 0xE000, image_io.UNDEFINED_LENGTH) + item
+            + struct.pack("<HHI", 0xFFFE, 0xE00D, 0)
+            + struct.pack("<HHI", 0xFFFE, 0xE0DD, 0))
+
+
+def build_dicom(stored: np.ndarray, explicit: bool = True, bits_stored: int = None, photometric: str = "MONOCHROME2",
+                window: tuple = None, rescale: tuple = None, sequence: bool = False,
+                transfer_syntax: str = None) -> bytes:
+    """Builds a single-frame grayscale DICOM file. ``stored`` holds the raw stored values (signed if int16/int8)."""
+    bits_allocated = 8 * stored.dtype.itemsize
+    transfer_syntax = transfer_syntax or (image_io.EXPLICIT_VR_LE if explicit else image_io.IMPLICIT_VR_LE)
+    # The file meta group is always explicit VR little endian
+    meta = element(0x0002, 0x0010, "UI", transfer_syntax)
+    meta = element(0x0002, 0x0000, "UL", struct.pack("<I", len(meta))) + meta
+
+    body = element(0x0008, 0x0060, "CS", "CR", explicit)
+    if sequence:
+        body += undefined_sequence(explicit)
+    body += element(0x0009, 0x0010, "LO", "PRIVATE CREATOR", explicit)
+    body += element(0x0028, 0x0002, "US", us(1), explicit)
+    body += element(0x0028, 0x0004, "CS", photometric, explicit)
+    body += element(0x0028, 0x0010, "US", us(stored.shape[0]), explicit)
+    body += element(0x0028, 0x0011, "US", us(stored.shape[1]), explicit)
+    body += element(0x0028, 0x0100, "US", us(bits_allocated), explicit)
+    body += element(0x0028, 0x0101, "US", us(bits_stored or bits_allocated), explicit)
+    body += element(0x0028, 0x0103, "US", us(1 if stored.dtype.kind == "i" else 0), explicit)
+    if window:
+        body += element(0x0028, 0x1050, "DS", "\\".join(str(c) for c in np.atleast_1d(window[0])), explicit)
+        body += element(0x0028, 0x1051, "DS", "\\".join(str(w) for w in np.atleast_1d(window[1])), explicit)
+    if rescale:
+        intercept, slope = rescale
+        body += element(0x0028, 0x1052, "DS", str(intercept), explicit)
+        body += element(0x0028, 0x1053, "DS", str(slope), explicit)
+    pixels = stored.astype(stored.dtype.newbyteorder("<")).tobytes()
+    body += element(0x7FE0, 0x0010, "OW" if bits_allocated == 16 else "OB", pixels, explicit)
+    return b"\0" * 128 + b"DICM" + meta + body
+
+
+@pytest.fixture
+def ramp12() -> np.ndarray:
+    """A 12-bit image spanning [0, 4095] with an odd width."""
+    return (np.arange(37 * 53, dtype=np.uint32) * 4095 // (37 * 53 - 1)).astype(np.uint16).reshape(37, 53)
+
+
+def write_dicom(tmp_path, data: bytes, name: str = "image.dcm") -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("explicit", [True, False], ids=["explicit", "implicit"])
+@pytest.mark.parametrize("sequence", [False, True], ids=["flat", "sequence"])
+def test_unsigned_pixels_and_metadata(tmp_path, ramp12, explicit, sequence):
+    path = write_dicom(tmp_path, build_dicom(ramp12, explicit, bits_stored=12, sequence=sequence))
+
+    image, max_value = image_io.read_image_with_max(path)
+    assert image.dtype == np.uint16
+    np.testing.assert_array_equal(image, ramp12)
+    assert max_value == 4095
+
+    meta = image_io.read_metadata(path)
+    assert meta["format"] == "DICOM"
+    assert meta["shape"] == ramp12.shape
+    assert meta["dtype"] == "uint16"
+    assert meta["bits_stored"] == 12
+    assert meta["modality"] == "CR"
+    assert meta["transfer_syntax"] == (image_io.EXPLICIT_VR_LE if explicit else image_io.IMPLICIT_VR_LE)
+    # The window center inside the sequence item belongs to another image and must not leak out
+    assert "window_center" not in meta
+
+
+@pytest.mark.parametrize("explicit", [True, False], ids=["explicit", "implicit"])
+def test_signed_pixels_are_shifted_to_unsigned(tmp_path, explicit):
+    stored = np.array([[-2048, -1, 0], [1, 2047, -100]], dtype=np.int16)
+    path = write_dicom(tmp_path, build_dicom(stored, explicit, bits_stored=12))
+
+    image, max_value = image_io.read_image_with_max(path)
+    assert image.dtype == np.uint16
+    np.testing.assert_array_equal(image, stored.astype(np.int32) + 2048)
+    assert max_value == 4095
+
+
+def test_monochrome1_is_inverted(tmp_path, ramp12):
+    path = write_dicom(tmp_path, build_dicom(ramp12, bits_stored=12, photometric="MONOCHROME1"))
+
+    np.testing.assert_array_equal(image_io.read_image(path), 4095 - ramp12)
+
+
+def test_8bit_dicom(tmp_path):
+    stored = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    path = write_dicom(tmp_path, build_dicom(stored, explicit=False))
+
+    image, max_value = image_io.read_image_with_max(path)
+    assert image.dtype == np.uint8
+    np.testing.assert_array_equal(image, stored)
+    assert max_value == 255
+
+
+@pytest.mark.parametrize("photometric", ["MONOCHROME2", "MONOCHROME1"])
+@pytest.mark.parametrize("signed", [False, True], ids=["unsigned", "signed"])
+def test_decode_image_matches_file_read(tmp_path, ramp12, photometric, signed):
+    stored = (ramp12.astype(np.int32) - 2048).astype(np.int16) if signed else ramp12
+    data = build_dicom(stored, bits_stored=12, photometric=photometric, sequence=True)
+    path = write_dicom(tmp_path, data)
+
+    decoded, max_value = image_io.decode_image(data)
+    np.testing.assert_array_equal(decoded, image_io.read_image(path))
+    np.testing.assert_array_equal(image_io.read_image(path, mmap=True), image_io.read_image(path))
+    assert max_value == 4095
+
+
+def test_read_dicom_rows_matches_whole_image(tmp_path, ramp12):
+    stored = (ramp12.astype(np.int32) - 2048).astype(np.int16)
+    path = write_dicom(tmp_path, build_dicom(stored, bits_stored=12, photometric="MONOCHROME1"))
+    meta = image_io.read_dicom_metadata(path)
+    whole = image_io.read_image(path)
+
+    with open(path, "rb") as f:
+        strips = [image_io.read_dicom_rows(f, meta, start, min(start + 10, len(whole)))
+                  for start in range(0, len(whole), 10)]
+    np.testing.assert_array_equal(np.concatenate(strips), whole)
+
+
+def test_header_window_without_window(tmp_path, ramp12):
+    path = write_dicom(tmp_path, build_dicom(ramp12, bits_stored=12))
+
+    assert image_io.header_window(path) is None
+
+
+@pytest.mark.parametrize("explicit", [True, False], ids=["explicit", "implicit"])
+def test_header_window_in_pixel_values(tmp_path, ramp12, explicit):
+    path = write_dicom(tmp_path, build_dicom(ramp12, explicit, bits_stored=12, window=((1000, 2000), (400, 800))))
+
+    # Only the first of several windows is used
+    assert image_io.header_window(path) == (1000.0, 400.0)
+
+
+def test_header_window_undoes_rescale_and_signed_shift(tmp_path):
+    stored = np.zeros((4, 4), dtype=np.int16)
+    # Hounsfield-style window center 40, width 400, with slope 2 and intercept -1024
+    path = write_dicom(tmp_path, build_dicom(stored, bits_stored=12, window=(40, 400), rescale=(-1024, 2)))
+
+    center, width = image_io.header_window(path)
+    assert center == pytest.approx((40 + 1024) / 2 + 2048)
+    assert width == pytest.approx(200)
+
+
+def test_header_window_monochrome1(tmp_path, ramp12):
+    path = write_dicom(tmp_path, build_dicom(ramp12, bits_stored=12, photometric="MONOCHROME1", window=(1000, 400)))
+
+    assert image_io.header_window(path) == (4095 - 1000.0, 400.0)
+
+
+def test_header_window_ignores_other_formats(tmp_path):
+    path = tmp_path / "image.npy"
+    np.save(path, np.zeros((2, 2), dtype=np.uint8))
+
+    assert image_io.header_window(str(path)) is None
+
+
+def test_rejects_compressed_transfer_syntax(tmp_path, ramp12):
+    path = write_dicom(tmp_path, build_dicom(ramp12, transfer_syntax=JPEG_BASELINE))
+
+    with pytest.raises(ValueError, match="transfer syntax"):
+        image_io.read_image(path)
+
+
+def test_rejects_truncated_pixel_data(tmp_path, ramp12):
+    data = build_dicom(ramp12, bits_stored=12)
+    path = write_dicom(tmp_path, data[:-100])
+
+    with pytest.raises(ValueError):
+        image_io.read_image(path)
@@ -0,0 +1,46 @@
+"""Incremental re-runs through enhancement.result_cache and the CLI's batch mode."""
+import cv2
+import numpy as np
+
+import enhance_cli
+from enhancement import result_cache
+
+# --- Constants ---
+VARIANTS = [("hist_eq", None), ("gamma", 0.7)]
+
+
+def run(input_dir, output_dir) -> result_cache.ResultCache:
+    """One CLI batch over the folder with a cache loaded from and saved to disk, as each CLI run does."""
+    cache = result_cache.ResultCache(str(output_dir))
+    files = sorted(str(path) for path in input_dir.iterdir())
+    summary = enhance_cli.run_batch(files, VARIANTS, str(output_dir), workers=1, cache=cache, with_histograms=False)
+    cache.save()
+    assert not summary["failures"]
+    return cache
+
+
+def test_changed_input_keeps_results_of_identical_copies(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    image = np.arange(48 * 64, dtype=np.uint32).reshape(48, 64) % 251
+    cv2.imwrite(str(input_dir / "a.png"), image.astype(np.uint8))
+    cv2.imwrite(str(input_dir / "b.png"), image.astype(np.uint8))
+    assert run(input_dir, output_dir).misses == 4
+
+    cv2.imwrite(str(input_dir / "a.png"), (255 - image).astype(np.uint8))
+    cache = run(input_dir, output_dir)
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    # b shared a's old content; its results must survive a's change
+    cache = run(input_dir, output_dir)
+    assert (cache.hits, cache.misses) == (4, 0)
+
+
+def test_unchanged_input_is_all_hits(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    cv2.imwrite(str(input_dir / "a.png"), np.full((8, 8), 100, dtype=np.uint8))
+    run(input_dir, output_dir)
+
+    cache = run(input_dir, output_dir)
+    assert (cache.hits, cache.misses) == (2, 0)